@@ -0,0 +1,16 @@
+import multiprocessing
+import os
+
+# ASGI: каждый воркер - отдельный процесс с циклом событий uvicorn
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+bind = os.environ.get('BIND', '0.0.0.0:8080')
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+keepalive = 5
+accesslog = None
+
+
+def on_starting(server):
+    # Настройки Django читают число воркеров из WEB_CONCURRENCY (кеш в памяти процесса отключается при > 1);
+    # передаем итоговое значение с учетом --workers и значения по умолчанию выше
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
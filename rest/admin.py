@@ -3,7 +3,13 @@ from django.contrib import admin
 from rest import models
 
 admin.site.register(models.Courier)
+admin.site.register(models.CourierRegion)
 admin.site.register(models.Order)
 admin.site.register(models.CourierOrder)
 admin.site.register(models.CourierWorkingHour)
 admin.site.register(models.OrderDeliveryHour)
+admin.site.register(models.OpenOrder)
+admin.site.register(models.CourierRegionStat)
+admin.site.register(models.OrderEvent)
+admin.site.register(models.RegionBacklog)
+admin.site.register(models.ReassignmentJob)
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
 
 
 class RestConfig(AppConfig):
     name = 'rest'
+
+    def ready(self):
+        connection_created.connect(apply_sqlite_pragmas)
@@ -0,0 +1,116 @@
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+
+WEIGHT_PRECISION = 100
+
+
+def to_units(weight):
+    return int(round(weight * WEIGHT_PRECISION))
+
+
+class AssignmentStrategy(ABC):
+    @abstractmethod
+    def select(self, orders, free_weight):
+        """ Возвращает заказы из orders (отсортированных по весу), которые нужно назначить курьеру """
+
+
+class GreedyStrategy(AssignmentStrategy):
+    """ Берет самые тяжелые заказы, пока они помещаются """
+
+    def select(self, orders, free_weight):
+        capacity = to_units(free_weight)
+        selected = []
+
+        for order in reversed(orders):
+            if capacity <= 0:
+                break
+
+            weight = to_units(order.weight)
+
+            if weight <= capacity:
+                capacity -= weight
+                selected.append(order)
+
+        return selected
+
+
+class LightestFirstStrategy(AssignmentStrategy):
+    """ Максимизирует количество заказов: берет самые легкие """
+
+    def select(self, orders, free_weight):
+        capacity = to_units(free_weight)
+        selected = []
+
+        for order in orders:
+            weight = to_units(order.weight)
+
+            if weight > capacity:
+                break
+
+            capacity -= weight
+            selected.append(order)
+
+        return list(reversed(selected))
+
+
+class KnapsackStrategy(AssignmentStrategy):
+    """ Максимизирует перевозимый вес: ограниченный рюкзак на битовых масках """
+
+    def select(self, orders, free_weight):
+        capacity = to_units(free_weight)
+        orders_by_weight = {}
+
+        for order in orders:
+            weight = to_units(order.weight)
+
+            if weight <= capacity:
+                orders_by_weight.setdefault(weight, []).append(order)
+
+        selected = orders_by_weight.pop(0, [])
+        items = []
+
+        for weight, same_weight_orders in orders_by_weight.items():
+            count = min(len(same_weight_orders), capacity // weight)
+            chunk = 1
+
+            while count > 0:
+                taken = min(chunk, count)
+                items.append((weight, taken))
+                count -= taken
+                chunk *= 2
+
+        mask = (1 << (capacity + 1)) - 1
+        reachable = 1
+        history = []
+
+        for weight, taken in items:
+            history.append(reachable)
+            reachable = (reachable | (reachable << (weight * taken))) & mask
+
+        target = reachable.bit_length() - 1
+        counts = {}
+
+        for index in range(len(items) - 1, -1, -1):
+            if not (history[index] >> target) & 1:
+                weight, taken = items[index]
+                counts[weight] = counts.get(weight, 0) + taken
+                target -= weight * taken
+
+        for weight in sorted(counts):
+            selected = orders_by_weight[weight][:counts[weight]] + selected
+
+        return selected
+
+
+STRATEGIES = {
+    'greedy': GreedyStrategy,
+    'lightest_first': LightestFirstStrategy,
+    'knapsack': KnapsackStrategy,
+}
+
+
+def get_strategy(courier_type):
+    name = getattr(settings, 'ASSIGNMENT_STRATEGIES', {}).get(courier_type, 'greedy')
+
+    return STRATEGIES[name]()
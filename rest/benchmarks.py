@@ -0,0 +1,137 @@
+import importlib.util
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from rest.models import Courier
+
+
+@contextmanager
+def benchmark_database():
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+SERVER_COMMANDS = {
+    'runserver': lambda port, workers: [
+        sys.executable, 'manage.py', 'runserver', '--noreload', '127.0.0.1:{}'.format(port)
+    ],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'restservice.asgi:application', '-c', 'gunicorn.conf.py',
+        '--workers', str(workers), '--bind', '127.0.0.1:{}'.format(port)
+    ],
+}
+SERVER_MODULES = {'asgi': ['gunicorn', 'uvicorn']}
+SERVER_ENV = {'asgi': {'DB_CONN_MAX_AGE': '0'}}
+
+
+def get_missing_server_modules(server):
+    return [module for module in SERVER_MODULES.get(server, []) if importlib.util.find_spec(module) is None]
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+
+    raise RuntimeError("Сервер не поднялся на порту {}".format(port))
+
+
+@contextmanager
+def benchmark_server(server, env, workers=4):
+    """ Мигрирует базу из env и поднимает сервис отдельным процессом; отдает адрес сервиса """
+    env = {**os.environ, **SERVER_ENV.get(server, {}), **env}
+    port = get_free_port()
+
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], env=env, cwd=settings.BASE_DIR, check=True)
+    process = subprocess.Popen(
+        SERVER_COMMANDS[server](port, workers),
+        env=env,
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    try:
+        wait_for_port(port)
+
+        yield 'http://127.0.0.1:{}'.format(port)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure(func, *args, **kwargs):
+    started_at = time.perf_counter()
+    result = func(*args, **kwargs)
+
+    return time.perf_counter() - started_at, result
+
+
+def percentile(values, fraction):
+    """ Перцентиль по ближайшему рангу: percentile(values, 0.95) - p95 """
+    ordered = sorted(values)
+
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def generate_hours(rnd, count):
+    hours = []
+    for _ in range(count):
+        start = rnd.randint(6 * 60, 20 * 60)
+        end = min(start + rnd.randint(30, 4 * 60), 23 * 60 + 59)
+        hours.append("{:02d}:{:02d}-{:02d}:{:02d}".format(start // 60, start % 60, end // 60, end % 60))
+
+    return hours
+
+
+def generate_orders(count, start_id=1, regions=100, seed=0):
+    rnd = random.Random(seed)
+
+    return [
+        {
+            "order_id": order_id,
+            "weight": round(rnd.uniform(0.01, 50), 2),
+            "region": rnd.randint(1, regions),
+            "delivery_hours": generate_hours(rnd, rnd.randint(1, 3))
+        } for order_id in range(start_id, start_id + count)
+    ]
+
+
+def generate_couriers(count, start_id=1, regions=100, seed=0):
+    rnd = random.Random(seed)
+    types = [courier_type for courier_type, _ in Courier.TYPES_WEIGHT]
+
+    return [
+        {
+            "courier_id": courier_id,
+            "courier_type": rnd.choice(types),
+            "regions": rnd.sample(range(1, regions + 1), rnd.randint(1, 5)),
+            "working_hours": generate_hours(rnd, rnd.randint(1, 3))
+        } for courier_id in range(start_id, start_id + count)
+    ]
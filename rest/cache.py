@@ -0,0 +1,55 @@
+import threading
+
+from django.core.cache import caches
+from django.db import transaction
+
+
+class CourierInfoCache:
+    ALIAS = 'couriers'
+    KEY = 'courier-info:{}'
+
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def get(courier_id):
+        info = caches[CourierInfoCache.ALIAS].get(CourierInfoCache.KEY.format(courier_id))
+
+        with CourierInfoCache._lock:
+            if info is None:
+                CourierInfoCache._misses += 1
+            else:
+                CourierInfoCache._hits += 1
+
+        return info
+
+    @staticmethod
+    def set(courier_id, info):
+        caches[CourierInfoCache.ALIAS].set(CourierInfoCache.KEY.format(courier_id), info)
+
+    @staticmethod
+    def invalidate(*courier_ids):
+        keys = [CourierInfoCache.KEY.format(courier_id) for courier_id in courier_ids]
+
+        if len(keys) == 0:
+            return
+
+        # Удаляем сразу и повторно после коммита, чтобы параллельный GET не закешировал незакоммиченное состояние
+        caches[CourierInfoCache.ALIAS].delete_many(keys)
+        transaction.on_commit(lambda: caches[CourierInfoCache.ALIAS].delete_many(keys))
+
+    @staticmethod
+    def clear():
+        caches[CourierInfoCache.ALIAS].clear()
+
+    @staticmethod
+    def get_stats():
+        with CourierInfoCache._lock:
+            hits, misses = CourierInfoCache._hits, CourierInfoCache._misses
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses > 0 else 0
+        }
@@ -0,0 +1,128 @@
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from rest.managers import CourierManager, OrderManager
+from rest.serializers import CourierImportSerializer, OrderImportSerializer
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def is_ndjson(request):
+    return request.content_type.split(';')[0].strip() == NDJSON_CONTENT_TYPE
+
+
+def parse_ndjson(stream):
+    if stream is None:
+        return
+
+    for line in stream:
+        line = line.strip()
+
+        if len(line) == 0:
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def chunked(items, size):
+    iterator = iter(items)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if len(chunk) == 0:
+            return
+
+        yield chunk
+
+
+class Importer:
+    BATCH_SIZE = 1000
+
+    serializer_class = None
+    manager_class = None
+    id_field = None
+
+    @classmethod
+    def validate(cls, items):
+        serializer = cls.serializer_class()
+        parsed_items = []
+
+        for data in items:
+            try:
+                validated_data = serializer.run_validation(data)
+                parsed_items.append((validated_data[cls.id_field], validated_data))
+            except ValidationError:
+                parsed_items.append((data.get(cls.id_field) if isinstance(data, dict) else None, None))
+
+        item_ids = [data[cls.id_field] for _, data in parsed_items if data is not None]
+        existing_ids = cls.manager_class.get_existing_ids(item_ids) if len(item_ids) > 0 else set()
+
+        valid_items = []
+        not_valid_ids = []
+        seen_ids = set()
+
+        for item_id, data in parsed_items:
+            if data is None or data[cls.id_field] in existing_ids or data[cls.id_field] in seen_ids:
+                not_valid_ids.append(item_id)
+                continue
+
+            seen_ids.add(data[cls.id_field])
+            valid_items.append(data)
+
+        return valid_items, not_valid_ids
+
+    @classmethod
+    def run(cls, items):
+        valid_items, not_valid_ids = cls.validate(items)
+
+        if len(not_valid_ids) > 0:
+            return [], [{"id": item_id} for item_id in not_valid_ids]
+
+        cls.manager_class.bulk_create(valid_items, batch_size=cls.BATCH_SIZE)
+
+        return [{"id": data[cls.id_field]} for data in valid_items], []
+
+    @classmethod
+    def run_stream(cls, items, chunk_size=None):
+        """
+        Импортирует поток пачками по chunk_size в одной транзакции: как и JSON-импорт, либо все, либо ничего.
+        Валидные строки пишутся и после первой ошибки, поэтому повторы id между пачками находит проверка по базе,
+        а в памяти остаются только текущая пачка и списки id для ответа
+        """
+        chunk_size = cls.BATCH_SIZE if chunk_size is None else chunk_size
+        valid_ids = []
+        not_valid_ids = []
+
+        with transaction.atomic():
+            for chunk in chunked(items, chunk_size):
+                valid_items, chunk_not_valid_ids = cls.validate(chunk)
+                not_valid_ids += chunk_not_valid_ids
+
+                cls.manager_class.bulk_create(valid_items, batch_size=chunk_size)
+                valid_ids += [data[cls.id_field] for data in valid_items]
+
+            if len(not_valid_ids) > 0:
+                transaction.set_rollback(True)
+
+                return [], [{"id": item_id} for item_id in not_valid_ids]
+
+        return [{"id": item_id} for item_id in valid_ids], []
+
+
+class CourierImporter(Importer):
+    serializer_class = CourierImportSerializer
+    manager_class = CourierManager
+    id_field = "courier_id"
+
+
+class OrderImporter(Importer):
+    serializer_class = OrderImportSerializer
+    manager_class = OrderManager
+    id_field = "order_id"
@@ -0,0 +1,76 @@
+from bisect import bisect_left
+from datetime import datetime, time
+
+from django.db.models import F, Q
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def to_minutes(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%H:%M").time()
+
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    if minutes >= MINUTES_IN_DAY:
+        return time.max
+
+    return time(minutes // 60, minutes % 60)
+
+
+def parse_interval(value):
+    start, end = value.split("-")
+
+    return to_minutes(start), to_minutes(end)
+
+
+def format_interval(start, end):
+    return "{:02d}:{:02d}-{:02d}:{:02d}".format(start // 60, start % 60, end // 60, end % 60)
+
+
+def split_interval(start, end):
+    if end < start:
+        return [(start, MINUTES_IN_DAY), (0, end)]
+
+    return [(start, end)]
+
+
+class IntervalIndex:
+    def __init__(self, intervals):
+        pieces = sorted(piece for start, end in intervals for piece in split_interval(start, end))
+        self.starts = []
+        self.ends = []
+
+        for start, end in pieces:
+            if len(self.ends) > 0 and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        for piece_start, piece_end in split_interval(start, end):
+            position = bisect_left(self.ends, piece_start)
+
+            if position < len(self.starts) and self.starts[position] <= piece_end:
+                return True
+
+        return False
+
+    def overlaps_any(self, intervals):
+        return any(self.overlaps(start, end) for start, end in intervals)
+
+    def as_q(self, start_field='start_minute', end_field='end_minute'):
+        query = Q()
+        is_wrapped = Q(**{end_field + '__lt': F(start_field)})
+
+        for start, end in zip(self.starts, self.ends):
+            query |= Q(**{start_field + '__lte': end, end_field + '__gte': start})
+            query |= is_wrapped & (Q(**{start_field + '__lte': end}) | Q(**{end_field + '__gte': start}))
+
+        return query
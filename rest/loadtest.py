@@ -0,0 +1,311 @@
+import asyncio
+import json
+import random
+import time
+from bisect import bisect_left
+from collections import Counter
+from urllib.parse import urlsplit
+
+from rest.benchmarks import generate_couriers, generate_orders, percentile
+
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+DEFAULT_MIX = {
+    'import_couriers': 1,
+    'import_orders': 2,
+    'assign': 3,
+    'complete': 3,
+    'get_courier': 8,
+}
+
+
+def make_request(name, method, path, body=None, content_type='application/json'):
+    return {"name": name, "method": method, "path": path, "body": body, "content_type": content_type}
+
+
+def parse_mix(values):
+    """ Разбирает ["assign=3", "get_courier=8"] в словарь весов поверх DEFAULT_MIX """
+    mix = dict(DEFAULT_MIX)
+
+    for value in values:
+        name, weight = value.split("=")
+
+        if name not in DEFAULT_MIX:
+            raise ValueError("Неизвестный тип запроса: {}".format(name))
+
+        mix[name] = int(weight)
+
+    return mix
+
+
+class ReplaySource:
+    """
+    Запросы из JSONL-журнала: по одному объекту {"method", "path", "body"?, "name"?} в строке.
+    Строки без method/path пропускаются и учитываются в skipped.
+    """
+
+    def __init__(self, lines):
+        self.requests = []
+        self.skipped = 0
+
+        for line in lines:
+            try:
+                item = json.loads(line)
+                request = make_request(
+                    item.get('name', item['path'].split('?')[0]),
+                    item['method'].upper(),
+                    item['path'],
+                    item.get('body'),
+                    item.get('content_type', 'application/json')
+                )
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.skipped += 1
+                continue
+
+            self.requests.append(request)
+
+        self.position = 0
+
+    def next_request(self):
+        if self.position >= len(self.requests):
+            return None
+
+        self.position += 1
+
+        return self.requests[self.position - 1]
+
+    def on_response(self, request, status, body):
+        pass
+
+
+class SyntheticSource:
+    """ Смесь импорта, назначений, завершений и чтений с учетом состояния сервиса """
+
+    COURIERS_PER_IMPORT = 10
+    ORDERS_PER_IMPORT = 50
+
+    def __init__(self, mix=None, start_id=1, regions=5, seed=0, courier_ids=None):
+        self.mix = mix or DEFAULT_MIX
+        self.rnd = random.Random(seed)
+        self.regions = regions
+        self.next_courier_id = start_id
+        self.next_order_id = start_id
+        self.courier_ids = list(courier_ids or [])
+        self.assigned = []
+
+    def next_request(self):
+        name = self.rnd.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+        if len(self.courier_ids) == 0 and name in ('assign', 'get_courier', 'complete'):
+            name = 'import_couriers'
+
+        if name == 'complete' and len(self.assigned) == 0:
+            name = 'assign'
+
+        if name == 'import_couriers':
+            couriers = generate_couriers(
+                self.COURIERS_PER_IMPORT, self.next_courier_id, self.regions, self.rnd.randrange(2 ** 32)
+            )
+            self.next_courier_id += len(couriers)
+
+            return make_request(name, 'POST', '/couriers', {"data": couriers})
+
+        if name == 'import_orders':
+            orders = generate_orders(
+                self.ORDERS_PER_IMPORT, self.next_order_id, self.regions, self.rnd.randrange(2 ** 32)
+            )
+            self.next_order_id += len(orders)
+
+            return make_request(name, 'POST', '/orders', {"data": orders})
+
+        if name == 'assign':
+            return make_request(name, 'POST', '/orders/assign', {"courier_id": self.rnd.choice(self.courier_ids)})
+
+        if name == 'complete':
+            courier_id, order_id = self.assigned.pop(self.rnd.randrange(len(self.assigned)))
+
+            return make_request(name, 'POST', '/orders/complete', {
+                "courier_id": courier_id,
+                "order_id": order_id,
+                "complete_time": "2021-01-10T10:33:01.42Z"
+            })
+
+        return make_request(name, 'GET', '/couriers/{}'.format(self.rnd.choice(self.courier_ids)))
+
+    def on_response(self, request, status, body):
+        if status >= 300:
+            return
+
+        if request['name'] == 'import_couriers':
+            self.courier_ids += [courier['courier_id'] for courier in request['body']['data']]
+        elif request['name'] == 'assign':
+            courier_id = request['body']['courier_id']
+            self.assigned += [(courier_id, order['id']) for order in json.loads(body)['orders']]
+
+
+class AsgiTransport:
+    """ Запросы напрямую в ASGI-приложение, без сети """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, path, body, content_type):
+        path, _, query_string = path.partition('?')
+        headers = [(b'host', b'localhost')]
+
+        if body is not None:
+            headers += [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'headers': headers,
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        messages = [{'type': 'http.request', 'body': body or b'', 'more_body': False}]
+        disconnected = asyncio.Event()
+        response = {'status': None, 'body': b''}
+
+        async def receive():
+            if len(messages) > 0:
+                return messages.pop(0)
+
+            await disconnected.wait()
+
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+                if not message.get('more_body', False):
+                    disconnected.set()
+
+        await self.application(scope, receive, send)
+
+        return response['status'], response['body']
+
+
+class HttpTransport:
+    """ HTTP/1.1 к запущенному сервису, по соединению на запрос """
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+
+        if url.scheme != 'http':
+            raise ValueError("Поддерживается только http")
+
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+
+    async def request(self, method, path, body, content_type):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        head = [
+            "{} {}{} HTTP/1.1".format(method, self.prefix, path),
+            "Host: {}".format(self.host),
+            "Connection: close",
+            "Content-Length: {}".format(len(body or b'')),
+        ]
+
+        if body is not None:
+            head.append("Content-Type: {}".format(content_type))
+
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + (body or b''))
+        await writer.drain()
+
+        data = await reader.read()
+        writer.close()
+
+        headers, _, response_body = data.partition(b"\r\n\r\n")
+
+        return int(headers.split(b" ", 2)[1]), response_body
+
+
+class LoadReport:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.duration = 0
+
+    def add(self, name, status, seconds):
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+        self.statuses.setdefault(name, Counter())[status] += 1
+
+    def get_total(self):
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    @staticmethod
+    def get_histogram(latencies):
+        labels = ["<={}".format(bound) for bound in HISTOGRAM_BOUNDS_MS] + [">{}".format(HISTOGRAM_BOUNDS_MS[-1])]
+        counts = [0] * len(labels)
+
+        for latency in latencies:
+            counts[bisect_left(HISTOGRAM_BOUNDS_MS, latency)] += 1
+
+        return {label: count for label, count in zip(labels, counts) if count > 0}
+
+    @staticmethod
+    def get_summary(latencies):
+        return {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.5), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "max_ms": round(max(latencies), 3),
+        }
+
+    def as_dict(self):
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+
+        return {
+            "requests": self.get_total(),
+            "duration_s": round(self.duration, 3),
+            "throughput_rps": round(self.get_total() / self.duration, 1) if self.duration > 0 else 0,
+            "latency": self.get_summary(all_latencies) if len(all_latencies) > 0 else {},
+            "histogram_ms": self.get_histogram(all_latencies),
+            "endpoints": {
+                name: dict(self.get_summary(latencies), statuses={
+                    str(status): count for status, count in sorted(self.statuses[name].items())
+                })
+                for name, latencies in sorted(self.latencies.items())
+            }
+        }
+
+
+async def run_load(transport, source, total, concurrency):
+    report = LoadReport()
+    counter = {'sent': 0}
+
+    async def worker():
+        while counter['sent'] < total:
+            request = source.next_request()
+
+            if request is None:
+                return
+
+            counter['sent'] += 1
+            body = None if request['body'] is None else json.dumps(request['body']).encode()
+
+            started_at = time.perf_counter()
+            status, response_body = await transport.request(
+                request['method'], request['path'], body, request['content_type']
+            )
+            report.add(request['name'], status, time.perf_counter() - started_at)
+
+            source.on_response(request, status, response_body)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    report.duration = time.perf_counter() - started_at
+
+    return report
@@ -0,0 +1,57 @@
+import random
+import statistics
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from rest.assignment import STRATEGIES, to_units
+from rest.benchmarks import measure
+from rest.models import Courier
+
+
+class Command(BaseCommand):
+    help = "Сравнивает стратегии назначения заказов по задержке и заполнению курьера"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', nargs='+', type=int, default=[10, 100, 1000, 10000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+
+        self.stdout.write("{:>6} {:>10} {:>15} {:>10} {:>10} {:>8} {:>7}".format(
+            "type", "candidates", "strategy", "p50, ms", "max, ms", "fill", "orders"
+        ))
+
+        for courier_type, max_weight in Courier.TYPES_WEIGHT:
+            for count in options['candidates']:
+                samples = [
+                    sorted(
+                        (SimpleNamespace(order_id=i, weight=round(rnd.uniform(0.01, max_weight), 2))
+                         for i in range(count)),
+                        key=lambda order: order.weight
+                    ) for _ in range(options['repeat'])
+                ]
+
+                for name, strategy_class in STRATEGIES.items():
+                    strategy = strategy_class()
+                    timings = []
+                    fill = []
+                    assigned = []
+
+                    for orders in samples:
+                        seconds, selected = measure(strategy.select, orders, max_weight)
+                        timings.append(seconds * 1000)
+                        fill.append(sum(to_units(order.weight) for order in selected) / to_units(max_weight))
+                        assigned.append(len(selected))
+
+                    self.stdout.write("{:>6} {:>10} {:>15} {:>10.3f} {:>10.3f} {:>7.1%} {:>7.1f}".format(
+                        courier_type,
+                        count,
+                        name,
+                        statistics.median(timings),
+                        max(timings),
+                        statistics.mean(fill),
+                        statistics.mean(assigned)
+                    ))
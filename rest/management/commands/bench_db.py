@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+
+from rest.benchmarks import SERVER_COMMANDS, benchmark_server, get_missing_server_modules
+from rest.loadtest import HttpTransport, SyntheticSource, run_load
+
+PROFILES = ['sqlite', 'sqlite-wal', 'postgres']
+
+
+@contextmanager
+def sqlite_database(profile):
+    with tempfile.TemporaryDirectory() as directory:
+        yield {'DB_PROFILE': profile, 'DB_NAME': os.path.join(directory, 'bench.sqlite3')}
+
+
+@contextmanager
+def postgres_database():
+    """ Временная база на сервере из DB_HOST/DB_PORT/DB_USER/DB_PASSWORD """
+    import psycopg2
+
+    name = 'restservice_bench_{}'.format(os.getpid())
+    params = dict(
+        dbname='postgres',
+        user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASSWORD', ''),
+        host=os.environ.get('DB_HOST', 'localhost'),
+        port=os.environ.get('DB_PORT', '5432'),
+        connect_timeout=5
+    )
+
+    admin = psycopg2.connect(**params)
+    admin.autocommit = True
+
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute('CREATE DATABASE "{}"'.format(name))
+
+        try:
+            yield {'DB_PROFILE': 'postgres', 'DB_NAME': name}
+        finally:
+            with admin.cursor() as cursor:
+                cursor.execute('DROP DATABASE IF EXISTS "{}"'.format(name))
+    finally:
+        admin.close()
+
+
+class Command(BaseCommand):
+    help = "Сравнивает пропускную способность POST /orders на разных профилях базы (DB_PROFILE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES)
+        parser.add_argument('--server', choices=list(SERVER_COMMANDS), default='runserver')
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=300, help="Запросов на каждый уровень конкурентности")
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        missing = get_missing_server_modules(options['server'])
+
+        if len(missing) > 0:
+            self.stderr.write("{}: не установлены {}".format(options['server'], ", ".join(missing)))
+            return
+
+        self.stdout.write("{:>10} {:>11} {:>9} {:>10} {:>9} {:>9} {:>7}".format(
+            "profile", "concurrency", "rps", "orders/s", "p50, ms", "p95, ms", "errors"
+        ))
+
+        for profile in options['profiles']:
+            try:
+                database = postgres_database() if profile == 'postgres' else sqlite_database(profile)
+
+                with database as env:
+                    with benchmark_server(options['server'], env, options['workers']) as url:
+                        self.bench_profile(profile, HttpTransport(url), options)
+            except Exception as e:
+                self.stderr.write("{}: пропущен ({})".format(profile, e))
+
+    def bench_profile(self, profile, transport, options):
+        start_id = 1
+
+        for concurrency in options['concurrency']:
+            source = SyntheticSource({'import_orders': 1}, start_id=start_id, seed=concurrency)
+            report = asyncio.run(run_load(transport, source, options['requests'], concurrency))
+            result = report.as_dict()
+            start_id = source.next_order_id
+
+            statuses = result['endpoints']['import_orders']['statuses']
+            created = statuses.get('201', 0)
+
+            self.stdout.write("{:>10} {:>11} {:>9} {:>10.1f} {p50_ms:>9.2f} {p95_ms:>9.2f} {:>7}".format(
+                profile,
+                concurrency,
+                result['throughput_rps'],
+                created * SyntheticSource.ORDERS_PER_IMPORT / report.duration,
+                result['requests'] - created,
+                **result['latency']
+            ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from rest.benchmarks import benchmark_database, generate_orders, measure
+from rest.importers import OrderImporter
+from rest.models import Order
+from rest.serializers import OrderSerializer
+
+
+def import_per_row(items):
+    for data in items:
+        serializer = OrderSerializer(data=data)
+
+        if serializer.is_valid():
+            serializer.save()
+
+
+class Command(BaseCommand):
+    help = "Сравнивает построчный и пакетный импорт заказов на временной базе"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--skip-per-row', action='store_true', help="Не замерять построчный импорт")
+
+    def handle(self, *args, **options):
+        self.stdout.write("{:>8} {:>12} {:>12} {:>9}".format("orders", "per-row, s", "bulk, s", "speedup"))
+
+        with benchmark_database():
+            for size in options['sizes']:
+                items = generate_orders(size)
+                per_row_seconds = None
+
+                if not options['skip_per_row']:
+                    per_row_seconds, _ = measure(import_per_row, items)
+                    Order.objects.all().delete()
+
+                bulk_seconds, (_, not_valid_ids) = measure(OrderImporter.run, items)
+                Order.objects.all().delete()
+
+                if len(not_valid_ids) > 0:
+                    self.stderr.write("{} заказов не прошли валидацию".format(len(not_valid_ids)))
+
+                self.stdout.write("{:>8} {:>12} {:>12.3f} {:>9}".format(
+                    size,
+                    "-" if per_row_seconds is None else "{:.3f}".format(per_row_seconds),
+                    bulk_seconds,
+                    "-" if per_row_seconds is None else "{:.1f}x".format(per_row_seconds / bulk_seconds)
+                ))
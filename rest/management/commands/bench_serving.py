@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from rest.benchmarks import SERVER_COMMANDS, benchmark_server, generate_couriers, generate_orders, \
+    get_missing_server_modules
+from rest.loadtest import HttpTransport, SyntheticSource, run_load
+
+
+class Command(BaseCommand):
+    help = "Сравнивает runserver и ASGI (gunicorn + uvicorn) на GET /couriers/{id} при разной конкурентности"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=list(SERVER_COMMANDS), default=list(SERVER_COMMANDS))
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50])
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--couriers', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        self.stdout.write("{:>10} {:>11} {:>9} {:>9} {:>9} {:>9}".format(
+            "server", "concurrency", "rps", "p50, ms", "p95, ms", "p99, ms"
+        ))
+
+        for server in options['servers']:
+            missing = get_missing_server_modules(server)
+
+            if len(missing) > 0:
+                self.stderr.write("{}: пропущен, не установлены {}".format(server, ", ".join(missing)))
+                continue
+
+            with tempfile.TemporaryDirectory() as directory:
+                env = {'DB_NAME': os.path.join(directory, 'bench.sqlite3')}
+
+                with benchmark_server(server, env, options['workers']) as url:
+                    self.bench_server(server, HttpTransport(url), options)
+
+    def bench_server(self, server, transport, options):
+        courier_ids = asyncio.run(self.seed(transport, options['couriers']))
+
+        for concurrency in options['concurrency']:
+            source = SyntheticSource({'get_courier': 1}, courier_ids=courier_ids, seed=concurrency)
+            result = asyncio.run(run_load(transport, source, options['requests'], concurrency)).as_dict()
+
+            self.stdout.write("{:>10} {:>11} {:>9} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f}".format(
+                server, concurrency, result['throughput_rps'], **result['latency']
+            ))
+
+    @staticmethod
+    async def seed(transport, count):
+        couriers = generate_couriers(count, regions=10)
+        orders = generate_orders(count * 5, regions=10)
+
+        for start in range(0, len(couriers), 500):
+            body = json.dumps({"data": couriers[start:start + 500]}).encode()
+            await transport.request('POST', '/couriers', body, 'application/json')
+
+        for start in range(0, len(orders), 500):
+            body = json.dumps({"data": orders[start:start + 500]}).encode()
+            await transport.request('POST', '/orders', body, 'application/json')
+
+        for courier in couriers[:count // 2]:
+            body = json.dumps({"courier_id": courier['courier_id']}).encode()
+            await transport.request('POST', '/orders/assign', body, 'application/json')
+
+        return [courier['courier_id'] for courier in couriers]
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest.cache import CourierInfoCache
+from rest.managers import CourierManager
+
+
+class Command(BaseCommand):
+    help = "Сверяет загрузку курьеров с назначенными заказами и при необходимости пересчитывает ее"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Записать пересчитанную загрузку")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatches = CourierManager.get_load_mismatches()
+
+            for courier_id, load, actual_load in mismatches:
+                self.stdout.write("Курьер {}: сохранено {}, фактически {}".format(courier_id, load, actual_load))
+
+            if options['fix']:
+                courier_ids = [courier_id for courier_id, load, actual_load in mismatches]
+
+                # Загрузка пересчитывается заново под блокировкой: между сверкой и записью могли пройти назначения
+                CourierManager.fix_load(courier_ids)
+                CourierInfoCache.invalidate(*courier_ids)
+
+        self.stdout.write("Расхождений: {}".format(len(mismatches)))
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from contextlib import nullcontext
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from rest.benchmarks import benchmark_database
+from rest.loadtest import AsgiTransport, HttpTransport, ReplaySource, SyntheticSource, parse_mix, run_load
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный прогон: синтетическая смесь запросов или повтор JSONL-журнала"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Адрес запущенного сервиса; без него запросы идут в ASGI-приложение "
+                                          "на временной базе")
+        parser.add_argument('--replay', help="JSONL-журнал запросов: {\"method\", \"path\", \"body\"} в строке")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--mix', nargs='*', default=[], help="Веса синтетической смеси, например assign=5")
+        parser.add_argument('--start-id', type=int, default=1, help="Первый id импортируемых курьеров и заказов")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', help="Сохранить отчет в JSON")
+
+    def handle(self, *args, **options):
+        try:
+            if options['replay']:
+                with open(options['replay']) as lines:
+                    source = ReplaySource(lines)
+
+                if source.skipped > 0:
+                    self.stderr.write("Пропущено строк без method/path: {}".format(source.skipped))
+            else:
+                source = SyntheticSource(parse_mix(options['mix']), options['start_id'], seed=options['seed'])
+
+            transport = HttpTransport(options['url']) if options['url'] else AsgiTransport(ASGIHandler())
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        with nullcontext() if options['url'] else benchmark_database():
+            report = asyncio.run(run_load(transport, source, options['requests'], options['concurrency']))
+
+        result = report.as_dict()
+        self.write_report(result)
+
+        if options['json']:
+            with open(options['json'], "w") as output:
+                json.dump(result, output, indent=2)
+
+    def write_report(self, result):
+        self.stdout.write("Запросов: {requests}, за {duration_s} с, {throughput_rps} rps".format(**result))
+        self.stdout.write("{:>16} {:>7} {:>9} {:>9} {:>9} {:>9}  {}".format(
+            "endpoint", "count", "p50, ms", "p95, ms", "p99, ms", "max, ms", "statuses"
+        ))
+
+        for name, summary in result['endpoints'].items():
+            self.stdout.write(
+                "{:>16} {count:>7} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f} {max_ms:>9.2f}  {}".format(
+                    name, json.dumps(summary['statuses']), **summary
+                )
+            )
+
+        total = max(1, result['requests'])
+        self.stdout.write("Гистограмма задержек:")
+
+        for bucket, count in result['histogram_ms'].items():
+            self.stdout.write("{:>8} ms {:>7} {}".format(bucket, count, "#" * round(40 * count / total)))
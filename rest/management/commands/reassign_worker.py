@@ -0,0 +1,63 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rest.managers import ReassignmentManager
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь отложенного перераспределения заказов курьеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help="Обработать текущую очередь и завершиться")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = 0
+
+            while True:
+                count = ReassignmentManager.run_pending(options['batch_size'])
+                processed += count
+
+                if count == 0:
+                    break
+
+            self.stdout.write("Обработано заданий: {}".format(processed))
+            return
+
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self.work, args=(stop, options['batch_size'], options['poll_interval']))
+            for _ in range(options['workers'])
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop.set()
+
+            for worker in workers:
+                worker.join()
+
+    def work(self, stop, batch_size, poll_interval):
+        try:
+            while not stop.is_set():
+                try:
+                    count = ReassignmentManager.run_pending(batch_size)
+                except Exception as e:
+                    self.stderr.write("Ошибка перераспределения заказов: {}".format(e))
+                    count = 0
+
+                if count == 0:
+                    stop.wait(poll_interval)
+        finally:
+            connection.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from rest.cache import CourierInfoCache
+from rest.managers import ProjectionManager
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает проекции (пул заказов, статистику курьеров, очередь регионов) по журналу событий заказов. "
+        "На PostgreSQL запись событий на время пересборки блокируется"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ProjectionManager.REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = ProjectionManager.rebuild(options['batch_size'])
+        CourierInfoCache.clear()
+
+        self.stdout.write("Применено событий: {}".format(count))
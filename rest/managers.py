@@ -1,8 +1,26 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from django.db import DatabaseError
-from django.db.models import Q
-from rest.models import Order, Courier, CourierWorkingHour, CourierOrder, OrderDeliveryHour
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Case, DateTimeField, Exists, ExpressionWrapper, F, FloatField, IntegerField, Max, Min, \
+    OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from rest.assignment import get_strategy
+from rest.cache import CourierInfoCache
+from rest.intervals import IntervalIndex, parse_interval
+from rest.models import Order, Courier, CourierRegion, CourierWorkingHour, CourierOrder, OrderDeliveryHour, \
+    CourierRegionStat, OpenOrder, OrderEvent, ReassignmentJob, RegionBacklog
+
+
+def to_datetime(value):
+    value = CourierOrder._meta.get_field('complete_time').to_python(value)
+
+    if value is not None and timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.utc)
+
+    return value
 
 
 class CourierManager:
@@ -13,17 +31,90 @@ class CourierManager:
             courier_type=courier_type,
             regions=regions
         )
+        CourierRegion.objects.bulk_create(CourierManager.get_region_objects(courier))
 
         for hours in working_hours:
-            splitted_hours = hours.split("-")
+            start_minute, end_minute = parse_interval(hours)
             CourierWorkingHour.objects.create(
                 courier=courier,
-                start_time=splitted_hours[0],
-                end_time=splitted_hours[1]
+                start_minute=start_minute,
+                end_minute=end_minute
             )
 
+        CourierInfoCache.invalidate(courier.courier_id)
+
         return courier
 
+    @staticmethod
+    def bulk_create(couriers, batch_size=None):
+        courier_objects = []
+        region_objects = []
+        working_hour_objects = []
+
+        for data in couriers:
+            courier = Courier(
+                courier_id=data['courier_id'],
+                courier_type=data['courier_type'],
+                regions=data['regions']
+            )
+            courier_objects.append(courier)
+            region_objects += CourierManager.get_region_objects(courier)
+
+            for hours in data['working_hours']:
+                start_minute, end_minute = parse_interval(hours)
+                working_hour_objects.append(CourierWorkingHour(
+                    courier=courier,
+                    start_minute=start_minute,
+                    end_minute=end_minute
+                ))
+
+        with transaction.atomic():
+            Courier.objects.bulk_create(courier_objects, batch_size=batch_size)
+            CourierRegion.objects.bulk_create(region_objects, batch_size=batch_size)
+            CourierWorkingHour.objects.bulk_create(working_hour_objects, batch_size=batch_size)
+
+        CourierInfoCache.invalidate(*[courier.courier_id for courier in courier_objects])
+
+        return courier_objects
+
+    @staticmethod
+    def get_region_objects(courier):
+        return [CourierRegion(courier=courier, region=region) for region in dict.fromkeys(courier.regions)]
+
+    @staticmethod
+    def set_regions(courier, regions):
+        with transaction.atomic(savepoint=False):
+            courier.regions = regions
+            courier.save(update_fields=['regions'])
+
+            CourierRegion.objects.filter(courier=courier).delete()
+            CourierRegion.objects.bulk_create(CourierManager.get_region_objects(courier))
+
+    @staticmethod
+    def get_existing_ids(courier_ids):
+        return set(Courier.objects.filter(courier_id__in=courier_ids).values_list('courier_id', flat=True))
+
+    @staticmethod
+    def get_list(region=None, courier_type=None, limit=100, offset=0):
+        couriers = Courier.objects.order_by('courier_id')
+
+        if courier_type is not None:
+            couriers = couriers.filter(courier_type=courier_type)
+
+        if region is not None:
+            couriers = couriers.filter(Exists(CourierRegion.objects.filter(courier=OuterRef('pk'), region=region)))
+
+        couriers = couriers.prefetch_related('courierworkinghour_set')[offset:offset + limit]
+
+        return [
+            {
+                "courier_id": courier.courier_id,
+                "courier_type": courier.courier_type,
+                "regions": courier.regions,
+                "working_hours": courier.get_working_hours()
+            } for courier in couriers
+        ]
+
     @staticmethod
     def get_started_orders(courier_id):
         return CourierOrder.objects \
@@ -31,6 +122,78 @@ class CourierManager:
             .order_by('assign_time') \
             .all()
 
+    @staticmethod
+    def get_last_assign_times(courier_ids):
+        return dict(
+            CourierOrder.objects
+            .filter(courier_id__in=courier_ids, complete_time__isnull=True)
+            .values('courier_id')
+            .annotate(last_assign_time=Max('assign_time'))
+            .values_list('courier_id', 'last_assign_time')
+        )
+
+    @staticmethod
+    def add_load(loads):
+        """ Атомарно меняет загрузку курьеров: loads - словарь {courier_id: изменение веса} """
+        loads = {courier_id: load for courier_id, load in loads.items() if load != 0}
+
+        if len(loads) == 0:
+            return
+
+        Courier.objects.filter(courier_id__in=loads).update(load=F('load') + Case(
+            *[When(courier_id=courier_id, then=Value(load)) for courier_id, load in loads.items()],
+            output_field=FloatField()
+        ))
+
+    @staticmethod
+    def get_load_mismatches():
+        actual_load = Coalesce(
+            Sum('courierorder__order__weight', filter=Q(courierorder__complete_time__isnull=True)), 0.0
+        )
+
+        return [
+            (courier_id, load, actual)
+            for courier_id, load, actual in Courier.objects
+            .annotate(actual_load=actual_load)
+            .values_list('courier_id', 'load', 'actual_load')
+            .order_by('courier_id')
+            if abs(load - actual) > 1e-6
+        ]
+
+    @staticmethod
+    def fix_load(courier_ids):
+        """
+        Пересчитывает загрузку курьеров по открытым заказам. Строки курьеров блокируются, как при назначении,
+        а сумма считается тем же UPDATE, поэтому изменения add_load, закоммиченные после сверки, не теряются
+        """
+        actual_load = CourierOrder.objects \
+            .filter(courier=OuterRef('pk'), complete_time__isnull=True) \
+            .values('courier') \
+            .annotate(total=Sum('order__weight')) \
+            .values('total')
+
+        with transaction.atomic():
+            couriers = Courier.objects.filter(courier_id__in=courier_ids)
+            list(couriers.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+            couriers.update(load=Coalesce(Subquery(actual_load, output_field=FloatField()), 0.0))
+
+    @staticmethod
+    def get_cached_info(courier_id):
+        """ Информация о курьере из кеша или из базы с записью в кеш; None, если курьера нет """
+        info = CourierInfoCache.get(courier_id)
+
+        if info is None:
+            courier = Courier.objects.filter(courier_id=courier_id).first()
+
+            if courier is None:
+                return None
+
+            info = CourierManager.get_info(courier)
+            CourierInfoCache.set(courier_id, info)
+
+        return info
+
     @staticmethod
     def get_info(courier):
         info = {
@@ -41,90 +204,79 @@ class CourierManager:
             "earnings": 0,
         }
 
-        orders_query = CourierOrder.objects \
-            .filter(courier_id=courier.courier_id, assign_time__isnull=False, complete_time__isnull=False) \
-            .values('order__region', 'assign_time', 'complete_time', '_cost') \
-            .order_by('order__region', 'assign_time', 'complete_time')
-
-        if orders_query.count() > 0:
-            orders_by_regions = {}
-            avg_time_per_region = {}
-
-            for order in orders_query:
-                info['earnings'] += order['_cost']
-
-                if order['order__region'] in orders_by_regions:
-                    orders_by_regions[order['order__region']].append({
-                        'assign_time': order['assign_time'],
-                        'complete_time': order['complete_time']
-                    })
-                else:
-                    orders_by_regions[order['order__region']] = [{
-                        'assign_time': order['assign_time'],
-                        'complete_time': order['complete_time']
-                    }]
-
-            for region in orders_by_regions:
-                assign_time = None
-                complete_time = None
-                count = 0
-                total_seconds = 0
-
-                for times in orders_by_regions[region]:
-                    if assign_time == times['assign_time']:
-                        total_seconds += (times['complete_time'] - complete_time).total_seconds()
-                        count += 1
-                        complete_time = times['complete_time']
-                    else:
-                        assign_time = times['assign_time']
-                        complete_time = times['complete_time']
-                        total_seconds += (times['complete_time'] - times['assign_time']).total_seconds()
-                        count += 1
-
-                avg_time_per_region[region] = total_seconds / count
-
-            info['rating'] = (60 * 60 - min(min(list(avg_time_per_region.values())), 60 * 60)) / (60 * 60) * 5
+        totals = CourierRegionStat.objects \
+            .filter(courier=courier, orders_count__gt=0) \
+            .aggregate(
+                earnings=Sum('total_cost'),
+                min_avg_time=Min(
+                    ExpressionWrapper(F('delivery_seconds') / F('orders_count'), output_field=FloatField())
+                )
+            )
+
+        if totals['earnings'] is not None:
+            info['earnings'] = totals['earnings']
+            info['rating'] = (60 * 60 - min(totals['min_avg_time'], 60 * 60)) / (60 * 60) * 5
 
         return info
 
     @staticmethod
     def reassign_orders(courier):
+        courier_regions = CourierRegion.objects.filter(courier=courier, region=OuterRef('order__region'))
         courier_orders = CourierOrder.objects \
             .filter(courier=courier, complete_time__isnull=True) \
+            .annotate(in_courier_regions=Exists(courier_regions)) \
+            .select_related('order') \
+            .prefetch_related('order__orderdeliveryhour_set') \
             .order_by('-order__weight')
 
-        courier_working_hours = CourierWorkingHour.objects.filter(courier=courier).all()
+        working_hours = IntervalIndex(
+            CourierWorkingHour.objects.filter(courier=courier).values_list('start_minute', 'end_minute')
+        )
         courier_weight = courier.get_max_weight()
+        dropped_courier_orders = []
 
         for courier_order in courier_orders:
             order = courier_order.order
 
             if courier_weight - order.weight < 0:
-                courier_order.delete()
+                dropped_courier_orders.append(courier_order)
                 continue
 
             courier_weight -= order.weight
 
-            if order.region not in courier.regions:
-                courier_order.delete()
+            if not courier_order.in_courier_regions:
+                dropped_courier_orders.append(courier_order)
                 continue
 
-            is_deletable = None
-            for order_hours in OrderDeliveryHour.objects.filter(order=order):
-                for courier_hours in courier_working_hours:
-                    if (
-                            order_hours.start_time < courier_hours.start_time or order_hours.start_time > courier_hours.end_time) \
-                            and (
-                            order_hours.end_time < courier_hours.start_time or order_hours.end_time > courier_hours.end_time):
-                        is_deletable = True if is_deletable is None else is_deletable and True
-                    else:
-                        is_deletable = False if is_deletable is None else is_deletable and False
+            delivery_hours = [(hours.start_minute, hours.end_minute) for hours in order.orderdeliveryhour_set.all()]
+
+            # Как и до перехода на индекс интервалов: без часов у заказа или у курьера сравнивать нечего, заказ остается
+            if len(delivery_hours) > 0 and len(working_hours) > 0 and not working_hours.overlaps_any(delivery_hours):
+                dropped_courier_orders.append(courier_order)
+
+        deletable_ids = [courier_order.id for courier_order in dropped_courier_orders]
+
+        if len(deletable_ids) > 0:
+            dropped_orders = [courier_order.order for courier_order in dropped_courier_orders]
 
-            if is_deletable is not None and is_deletable:
-                courier_order.delete()
+            CourierOrder.objects.filter(id__in=deletable_ids).delete()
+            OrderEventManager.append([
+                OrderEvent(order=order, courier=courier, kind=OrderEvent.KIND_UNASSIGNED, time=datetime.now())
+                for order in dropped_orders
+            ])
+            CourierManager.add_load({courier.courier_id: -sum(order.weight for order in dropped_orders)})
+
+        return deletable_ids
 
 
 class OrderManager:
+    ASSIGN_ATTEMPTS = 3
+    COMPLETE_CHUNK_SIZE = 500
+
+    STATUS_NEW = 'new'
+    STATUS_ASSIGNED = 'assigned'
+    STATUS_COMPLETED = 'completed'
+
     @staticmethod
     def create(order_id, weight, region, delivery_hours):
         order = Order.objects.create(
@@ -133,56 +285,121 @@ class OrderManager:
             region=region
         )
 
-        for time in delivery_hours:
-            hours = time.split("-")
+        for hours in delivery_hours:
+            start_minute, end_minute = parse_interval(hours)
             OrderDeliveryHour.objects.create(
                 order=order,
-                start_time=hours[0],
-                end_time=hours[1]
+                start_minute=start_minute,
+                end_minute=end_minute
             )
 
+        OrderEventManager.append([OrderEvent(order=order, kind=OrderEvent.KIND_CREATED, time=datetime.now())])
+
         return order
 
     @staticmethod
-    def get_orders_to_assign(courier_id):
+    def bulk_create(orders, batch_size=None):
+        order_objects = []
+        delivery_hour_objects = []
+
+        for data in orders:
+            order = Order(
+                order_id=data['order_id'],
+                weight=data['weight'],
+                region=data['region']
+            )
+            order_objects.append(order)
+
+            for hours in data['delivery_hours']:
+                start_minute, end_minute = parse_interval(hours)
+                delivery_hour_objects.append(OrderDeliveryHour(
+                    order=order,
+                    start_minute=start_minute,
+                    end_minute=end_minute
+                ))
+
+        with transaction.atomic():
+            Order.objects.bulk_create(order_objects, batch_size=batch_size)
+            OrderDeliveryHour.objects.bulk_create(delivery_hour_objects, batch_size=batch_size)
+            OrderEventManager.append([
+                OrderEvent(order=order, kind=OrderEvent.KIND_CREATED, time=datetime.now()) for order in order_objects
+            ], batch_size=batch_size)
+
+        return order_objects
+
+    @staticmethod
+    def get_existing_ids(order_ids):
+        return set(Order.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+
+    @staticmethod
+    def get_list(status=None, limit=100, offset=0):
+        orders = Order.objects.order_by('order_id')
+
+        if status == OrderManager.STATUS_NEW:
+            orders = orders.filter(~Exists(CourierOrder.objects.filter(order=OuterRef('pk'))))
+        elif status == OrderManager.STATUS_ASSIGNED:
+            orders = orders.filter(courierorder__isnull=False, courierorder__complete_time__isnull=True)
+        elif status == OrderManager.STATUS_COMPLETED:
+            orders = orders.filter(courierorder__complete_time__isnull=False)
+        elif status is not None:
+            raise ValueError("Передан некорректный статус заказа")
+
+        orders = orders.prefetch_related('orderdeliveryhour_set')[offset:offset + limit]
+
+        return [
+            {
+                "order_id": order.order_id,
+                "weight": order.weight,
+                "region": order.region,
+                "delivery_hours": order.get_delivery_hours()
+            } for order in orders
+        ]
+
+    @staticmethod
+    def assign(courier_id):
+        for attempt in range(OrderManager.ASSIGN_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    orders = OrderManager.get_orders_to_assign(courier_id, lock=True)
+
+                    return OrderManager.assign_orders_to_courier(courier_id, orders, lock=True)
+            except IntegrityError:
+                if attempt == OrderManager.ASSIGN_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def get_orders_to_assign(courier_id, lock=False):
+        couriers = Courier.objects.select_for_update() if lock else Courier.objects
+
         try:
-            courier = Courier.objects.get(courier_id=courier_id)
+            courier = couriers.get(courier_id=courier_id)
         except Exception:
             raise ValueError("Передан некорректный id курьера")
 
-        working_hours = CourierWorkingHour.objects.filter(courier=courier).all()
-
-        if working_hours is None:
-            raise ValueError("У курьера нет рабочих часов")
-
-        orders_filter = Order.objects.filter(
-            weight__lt=courier.get_max_weight(),
-            region__in=courier.regions,
-            courierorder__assign_time__isnull=True,
-            courierorder__complete_time__isnull=True
+        working_hours = IntervalIndex(
+            CourierWorkingHour.objects.filter(courier=courier).values_list('start_minute', 'end_minute')
         )
 
-        hours_query = Q()
+        if len(working_hours) == 0:
+            return []
 
-        for hours in working_hours:
-            hours_query = hours_query | (
-                    Q(orderdeliveryhour__start_time__range=(hours.start_time, hours.end_time)) |
-                    Q(orderdeliveryhour__end_time__range=(hours.start_time, hours.end_time))
-            )
+        delivery_hours = OrderDeliveryHour.objects.filter(working_hours.as_q(), order=OuterRef('order_id'))
 
-        hours_filter = Order.objects.filter(hours_query)
-        orders = (orders_filter & hours_filter).distinct().order_by('weight')
+        orders = OpenOrder.objects \
+            .filter(region__in=courier.regions, weight__lte=courier.get_free_weight()) \
+            .filter(Exists(delivery_hours)) \
+            .values_list('order_id', 'weight', 'region') \
+            .order_by('weight')
 
-        return list(orders.all())
+        return [Order(order_id=order_id, weight=weight, region=region) for order_id, weight, region in orders]
 
     @staticmethod
-    def assign_orders_to_courier(courier_id, orders):
+    def assign_orders_to_courier(courier_id, orders, lock=False):
         try:
             courier = Courier.objects.get(courier_id=courier_id)
         except Exception:
             raise ValueError("Передан некорректный id курьера")
 
-        assigned_order_ids = []
         free_weight = courier.get_free_weight()
         started_orders = CourierManager.get_started_orders(courier_id)
 
@@ -191,46 +408,590 @@ class OrderManager:
         else:
             assign_time = datetime.now()
 
-        while free_weight > 0 and len(orders) > 0:
-            order = orders.pop()
+        strategy = get_strategy(courier.courier_type)
+        selected_orders = strategy.select(orders, free_weight)
+
+        while lock and len(selected_orders) > 0:
+            order_ids = [order.order_id for order in selected_orders]
+            lost_order_ids = set(order_ids) - OrderManager.claim_orders(order_ids)
+
+            if len(lost_order_ids) == 0:
+                break
+
+            orders = [order for order in orders if order.order_id not in lost_order_ids]
+            selected_orders = strategy.select(orders, free_weight)
+
+        CourierOrderManager.bulk_create([(courier, order, assign_time) for order in selected_orders])
+
+        return OrderManager.get_assign_response(selected_orders, assign_time)
+
+    @staticmethod
+    def assign_batch(courier_ids):
+        for attempt in range(OrderManager.ASSIGN_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return OrderManager.assign_orders_to_couriers(courier_ids, lock=True)
+            except IntegrityError:
+                if attempt == OrderManager.ASSIGN_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def assign_orders_to_couriers(courier_ids, lock=False):
+        couriers = Courier.objects.select_for_update() if lock else Courier.objects
+        couriers = {
+            courier.courier_id: courier for courier in couriers.filter(courier_id__in=courier_ids).order_by('pk')
+        }
+
+        if len(couriers) != len(set(courier_ids)):
+            raise ValueError("Передан некорректный id курьера")
+
+        working_hours = {}
+        for courier_id, start_minute, end_minute in CourierWorkingHour.objects \
+                .filter(courier_id__in=couriers) \
+                .values_list('courier_id', 'start_minute', 'end_minute'):
+            working_hours.setdefault(courier_id, []).append((start_minute, end_minute))
 
-            if free_weight - order.weight >= 0:
-                free_weight -= order.weight
-                CourierOrderManager.create(courier, order, assign_time)
-                assigned_order_ids.append({"id": order.order_id})
+        last_assign_times = CourierManager.get_last_assign_times(couriers)
+        free_weights = {courier_id: courier.get_free_weight() for courier_id, courier in couriers.items()}
 
-        if len(assigned_order_ids) > 0:
-            response = {
-                "orders": assigned_order_ids,
+        orders = {}
+        orders_by_region = {}
+        delivery_hours = {}
+        regions = set(region for courier in couriers.values() for region in courier.regions)
+
+        candidates = OpenOrder.objects \
+            .filter(region__in=regions, weight__lte=max(free_weights.values(), default=0))
+
+        for order_id, weight, region in candidates.values_list('order_id', 'weight', 'region'):
+            orders[order_id] = Order(order_id=order_id, weight=weight, region=region)
+            orders_by_region.setdefault(region, []).append(orders[order_id])
+            delivery_hours[order_id] = []
+
+        for order_id, start_minute, end_minute in OrderDeliveryHour.objects \
+                .filter(order__in=candidates.values('order_id')) \
+                .values_list('order_id', 'start_minute', 'end_minute'):
+            if order_id in delivery_hours:
+                delivery_hours[order_id].append((start_minute, end_minute))
+
+        now = datetime.now()
+        lost_order_ids = set()
+
+        while True:
+            # Заказы, которые не удалось захватить, исключаются так же, как уже выбранные другим курьером
+            taken_order_ids = set(lost_order_ids)
+            assignments = []
+            responses = []
+
+            for courier_id in dict.fromkeys(courier_ids):
+                courier = couriers[courier_id]
+                index = IntervalIndex(working_hours.get(courier_id, []))
+                free_weight = free_weights[courier_id]
+                assign_time = last_assign_times.get(courier_id) or now
+
+                candidates = sorted(
+                    (
+                        order for region in set(courier.regions) for order in orders_by_region.get(region, [])
+                        if order.order_id not in taken_order_ids
+                        and order.weight <= free_weight
+                        and index.overlaps_any(delivery_hours[order.order_id])
+                    ),
+                    key=lambda order: order.weight
+                )
+
+                selected_orders = get_strategy(courier.courier_type).select(candidates, free_weight)
+                taken_order_ids.update(order.order_id for order in selected_orders)
+                assignments += [(courier, order, assign_time) for order in selected_orders]
+
+                responses.append(dict(
+                    courier_id=courier_id,
+                    **OrderManager.get_assign_response(selected_orders, assign_time)
+                ))
+
+            order_ids = [order.order_id for _, order, _ in assignments]
+
+            if not lock or len(order_ids) == 0:
+                break
+
+            lost = set(order_ids) - OrderManager.claim_orders(order_ids)
+
+            if len(lost) == 0:
+                break
+
+            lost_order_ids.update(lost)
+
+        CourierOrderManager.bulk_create(assignments)
+
+        return {"couriers": responses}
+
+    @staticmethod
+    def claim_orders(order_ids):
+        """
+        Блокирует строки пула только для выбранных заказов (FOR UPDATE SKIP LOCKED). Возвращает захваченные id;
+        заказы, которые держит другая транзакция или уже забрал другой курьер, в результат не попадают
+        """
+        return set(
+            OpenOrder.objects
+            .select_for_update(skip_locked=True)
+            .filter(order_id__in=order_ids)
+            .values_list('order_id', flat=True)
+        )
+
+    @staticmethod
+    def get_assign_response(orders, assign_time):
+        if len(orders) > 0:
+            return {
+                "orders": [{"id": order.order_id} for order in orders],
                 "assign_time": assign_time.isoformat()
             }
-        else:
-            response = {
-                "orders": []
-            }
 
-        return response
+        return {
+            "orders": []
+        }
 
     @staticmethod
-    def complete(courier_id, order_id, complete_time):
+    def parse_completion(courier_id, order_id, complete_time):
         try:
-            courier_order = CourierOrder.objects.get(courier_id=courier_id, order_id=order_id)
-        except Exception:
-            raise DatabaseError("Заказ с заданными параметрами не найден")
+            courier_id = Courier._meta.pk.to_python(courier_id)
+            order_id = Order._meta.pk.to_python(order_id)
+        except ValidationError:
+            raise DatabaseError("Передан некорректный id курьера или заказа")
 
-        courier_order.complete_time = complete_time
-        courier_order.save()
+        try:
+            complete_time = to_datetime(complete_time)
+        except ValidationError:
+            raise DatabaseError("Передано некорректное время завершения заказа")
 
-        return {"order_id": courier_order.order.order_id}
+        if courier_id is None or order_id is None or complete_time is None:
+            raise DatabaseError("Переданы неполные данные о завершении заказа")
+
+        return courier_id, order_id, complete_time
+
+    @staticmethod
+    def complete(courier_id, order_id, complete_time):
+        """ Завершает заказ одним условным UPDATE; повторное завершение не меняет время и статистику """
+        courier_id, order_id, complete_time = OrderManager.parse_completion(courier_id, order_id, complete_time)
+        courier_orders = CourierOrder.objects.filter(courier_id=courier_id, order_id=order_id)
+
+        with transaction.atomic():
+            if courier_orders.filter(complete_time__isnull=True).update(complete_time=complete_time) == 0:
+                if not courier_orders.exists():
+                    raise DatabaseError("Заказ с заданными параметрами не найден")
+
+                return {"order_id": order_id}
+
+            OrderManager.record_completions(courier_orders.select_related('order'), {order_id: complete_time})
+
+        CourierInfoCache.invalidate(courier_id)
+
+        return {"order_id": order_id}
+
+    @staticmethod
+    def complete_batch(completions):
+        """
+        Завершает пачку [{"courier_id", "order_id", "complete_time"}, ...] в одной транзакции, например
+        при синхронизации приложения курьера после работы без сети. Уже завершенные заказы пропускаются;
+        если хотя бы один элемент некорректен, не завершается ничего.
+        Возвращает (завершенные заказы, некорректные заказы)
+        """
+        entries = []
+        not_valid_ids = []
+
+        for data in completions:
+            try:
+                entries.append(OrderManager.parse_completion(
+                    data['courier_id'], data['order_id'], data['complete_time']
+                ))
+            except (DatabaseError, KeyError, TypeError):
+                not_valid_ids.append(data.get('order_id') if isinstance(data, dict) else None)
+
+        order_ids = list(dict.fromkeys(order_id for courier_id, order_id, complete_time in entries))
+        chunk_size = OrderManager.COMPLETE_CHUNK_SIZE
+
+        with transaction.atomic():
+            courier_orders = {}
+
+            for start in range(0, len(order_ids), chunk_size):
+                courier_orders.update(
+                    (courier_order.order_id, courier_order) for courier_order in CourierOrder.objects
+                    .select_for_update(of=('self',))
+                    .select_related('order')
+                    .filter(order_id__in=order_ids[start:start + chunk_size])
+                )
+
+            for courier_id, order_id, complete_time in entries:
+                if order_id not in courier_orders or courier_orders[order_id].courier_id != courier_id:
+                    not_valid_ids.append(order_id)
+
+            if len(not_valid_ids) > 0:
+                return [], [{"id": order_id} for order_id in not_valid_ids]
+
+            complete_times = {}
+
+            for courier_id, order_id, complete_time in entries:
+                if courier_orders[order_id].complete_time is None:
+                    complete_times.setdefault(order_id, complete_time)
+
+            # Время доставки считается от предыдущего завершения курьера, поэтому пачка из офлайн-приложения,
+            # пришедшая не по порядку, применяется в порядке завершения
+            completed_ids = sorted(
+                complete_times, key=lambda order_id: (courier_orders[order_id].courier_id, complete_times[order_id])
+            )
+
+            for start in range(0, len(completed_ids), chunk_size):
+                chunk = completed_ids[start:start + chunk_size]
+                CourierOrder.objects.filter(order_id__in=chunk, complete_time__isnull=True).update(complete_time=Case(
+                    *[When(order_id=order_id, then=Value(complete_times[order_id])) for order_id in chunk],
+                    output_field=DateTimeField()
+                ))
+
+            OrderManager.record_completions([courier_orders[order_id] for order_id in completed_ids], complete_times)
+
+        CourierInfoCache.invalidate(*set(courier_orders[order_id].courier_id for order_id in completed_ids))
+
+        return [{"id": order_id} for order_id in order_ids], []
+
+    @staticmethod
+    def record_completions(courier_orders, complete_times):
+        """ Журнал и загрузка курьеров для только что завершенных заказов; complete_times - {order_id: время} """
+        events = []
+        assign_times = {}
+        loads = {}
+
+        for courier_order in courier_orders:
+            events.append(OrderEvent(
+                order=courier_order.order,
+                courier_id=courier_order.courier_id,
+                kind=OrderEvent.KIND_COMPLETED,
+                time=complete_times[courier_order.order_id],
+                cost=courier_order.cost
+            ))
+            assign_times[courier_order.order_id] = to_datetime(courier_order.assign_time)
+            loads[courier_order.courier_id] = loads.get(courier_order.courier_id, 0) - courier_order.order.weight
+
+        if len(events) > 0:
+            OrderEventManager.append(events, assign_times=assign_times)
+            CourierManager.add_load(loads)
 
 
 class CourierOrderManager:
+    @staticmethod
+    def get_cost(courier_type):
+        return CourierOrder.BASE_COST * Courier.TYPES_COEFFICIENT[courier_type]
+
     @staticmethod
     def create(courier, order, assign_time=None, complete_time=None):
-        return CourierOrder.objects.create(
+        courier_order = CourierOrder.objects.create(
             courier=courier,
             order=order,
             assign_time=assign_time if assign_time is not None else datetime.now(),
             complete_time=complete_time,
-            cost=None
+            cost=CourierOrderManager.get_cost(courier.courier_type)
+        )
+        events = [OrderEvent(
+            order=order, courier=courier, kind=OrderEvent.KIND_ASSIGNED, time=to_datetime(courier_order.assign_time)
+        )]
+
+        if complete_time is not None:
+            events.append(OrderEvent(
+                order=order,
+                courier=courier,
+                kind=OrderEvent.KIND_COMPLETED,
+                time=to_datetime(complete_time),
+                cost=courier_order.cost
+            ))
+        else:
+            CourierManager.add_load({courier_order.courier_id: order.weight})
+
+        OrderEventManager.append(events)
+
+        CourierInfoCache.invalidate(courier_order.courier_id)
+
+        return courier_order
+
+    @staticmethod
+    def bulk_create(assignments):
+        courier_orders = CourierOrder.objects.bulk_create([
+            CourierOrder(
+                courier=courier,
+                order=order,
+                assign_time=assign_time,
+                cost=CourierOrderManager.get_cost(courier.courier_type)
+            ) for courier, order, assign_time in assignments
+        ])
+        OrderEventManager.append([
+            OrderEvent(order=order, courier=courier, kind=OrderEvent.KIND_ASSIGNED, time=assign_time)
+            for courier, order, assign_time in assignments
+        ])
+
+        loads = {}
+        for courier, order, assign_time in assignments:
+            loads[courier.courier_id] = loads.get(courier.courier_id, 0) + order.weight
+
+        CourierManager.add_load(loads)
+        CourierInfoCache.invalidate(*set(courier_order.courier_id for courier_order in courier_orders))
+
+        return courier_orders
+
+
+class OrderEventManager:
+    @staticmethod
+    def append(events, assign_times=None, batch_size=None):
+        """ Дописывает события в журнал и в той же транзакции применяет их к проекциям """
+        with transaction.atomic(savepoint=False):
+            events = OrderEvent.objects.bulk_create(events, batch_size=batch_size)
+            ProjectionManager.apply(events, {} if assign_times is None else assign_times, batch_size=batch_size)
+
+        return events
+
+    @staticmethod
+    def get_history(order_id):
+        return list(
+            OrderEvent.objects
+            .filter(order_id=order_id)
+            .order_by('id')
+            .values_list('kind', 'courier_id', 'time')
+        )
+
+
+class ProjectionManager:
+    REBUILD_BATCH_SIZE = 5000
+
+    @staticmethod
+    def apply(events, assign_times, batch_size=None):
+        """
+        Применяет события к проекциям. assign_times - {order_id: время назначения} для заказов, чье
+        назначение было в предыдущих пачках; дополняется событиями пачки
+        """
+        OrderPoolManager.apply(events, batch_size=batch_size)
+        RegionBacklogManager.apply(events)
+        CourierStatManager.apply(events, assign_times)
+
+    @staticmethod
+    def rebuild(batch_size=REBUILD_BATCH_SIZE):
+        """ Пересобирает проекции проигрыванием журнала пачками; возвращает число событий """
+        assign_times = {}
+        last_id = 0
+        count = 0
+
+        with transaction.atomic():
+            ProjectionManager.lock()
+
+            OpenOrder.objects.all().delete()
+            RegionBacklog.objects.all().delete()
+            CourierRegionStat.objects.all().delete()
+
+            while True:
+                events = list(
+                    OrderEvent.objects
+                    .filter(id__gt=last_id)
+                    .select_related('order')
+                    .order_by('id')[:batch_size]
+                )
+
+                if len(events) == 0:
+                    break
+
+                ProjectionManager.apply(events, assign_times, batch_size=batch_size)
+                last_id = events[-1].id
+                count += len(events)
+
+        return count
+
+    @staticmethod
+    def lock():
+        """
+        На PostgreSQL блокирует журнал и проекции до конца транзакции пересборки: дожидается незавершенных
+        append, а новые ждут коммита, после чего применяют свои события уже к пересобранным проекциям.
+        SQLite и так допускает одного пишущего
+        """
+        if connection.vendor != 'postgresql':
+            return
+
+        tables = [model._meta.db_table for model in (OrderEvent, OpenOrder, RegionBacklog, CourierRegionStat)]
+
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE {} IN EXCLUSIVE MODE".format(", ".join(tables)))
+
+
+class OrderPoolManager:
+    @staticmethod
+    def add(orders, batch_size=None):
+        OpenOrder.objects.bulk_create(
+            [OpenOrder(order=order, region=order.region, weight=order.weight) for order in orders],
+            batch_size=batch_size
+        )
+
+    @staticmethod
+    def remove(order_ids):
+        if len(order_ids) > 0:
+            OpenOrder.objects.filter(order_id__in=order_ids).delete()
+
+    @staticmethod
+    def apply(events, batch_size=None):
+        # Последнее событие пачки решает, лежит ли заказ в пуле: None - заказ назначен
+        orders = {}
+
+        for event in events:
+            if event.kind in (OrderEvent.KIND_CREATED, OrderEvent.KIND_UNASSIGNED):
+                orders[event.order_id] = event.order
+            elif event.kind == OrderEvent.KIND_ASSIGNED:
+                orders[event.order_id] = None
+
+        OrderPoolManager.remove([order_id for order_id, order in orders.items() if order is None])
+        OrderPoolManager.add([order for order in orders.values() if order is not None], batch_size=batch_size)
+
+
+class RegionBacklogManager:
+    @staticmethod
+    def apply(events):
+        deltas = {}
+
+        for event in events:
+            open_orders, open_weight, assigned_orders = deltas.get(event.order.region, (0, 0, 0))
+
+            if event.kind in (OrderEvent.KIND_CREATED, OrderEvent.KIND_UNASSIGNED):
+                open_orders, open_weight = open_orders + 1, open_weight + event.order.weight
+            elif event.kind == OrderEvent.KIND_ASSIGNED:
+                open_orders, open_weight = open_orders - 1, open_weight - event.order.weight
+
+            if event.kind == OrderEvent.KIND_ASSIGNED:
+                assigned_orders += 1
+            elif event.kind in (OrderEvent.KIND_UNASSIGNED, OrderEvent.KIND_COMPLETED):
+                assigned_orders -= 1
+
+            deltas[event.order.region] = (open_orders, open_weight, assigned_orders)
+
+        if len(deltas) == 0:
+            return
+
+        def delta(position, output_field):
+            return Case(
+                *[When(region=region, then=Value(values[position])) for region, values in deltas.items()],
+                output_field=output_field
+            )
+
+        RegionBacklog.objects.bulk_create([RegionBacklog(region=region) for region in deltas], ignore_conflicts=True)
+        RegionBacklog.objects.filter(region__in=deltas).update(
+            open_orders=F('open_orders') + delta(0, IntegerField()),
+            open_weight=F('open_weight') + delta(1, FloatField()),
+            assigned_orders=F('assigned_orders') + delta(2, IntegerField())
+        )
+
+    @staticmethod
+    def get_list():
+        return [
+            {
+                "region": backlog.region,
+                "open_orders": backlog.open_orders,
+                "open_weight": round(backlog.open_weight, 2),
+                "assigned_orders": backlog.assigned_orders,
+            } for backlog in RegionBacklog.objects.order_by('region')
+        ]
+
+
+class CourierStatManager:
+    @staticmethod
+    def apply(events, assign_times):
+        completions = []
+
+        for event in events:
+            if event.kind == OrderEvent.KIND_ASSIGNED:
+                assign_times[event.order_id] = to_datetime(event.time)
+            elif event.kind == OrderEvent.KIND_UNASSIGNED:
+                assign_times.pop(event.order_id, None)
+            elif event.kind == OrderEvent.KIND_COMPLETED:
+                if event.order_id not in assign_times:
+                    raise ValueError("В журнале нет назначения для завершенного заказа {}".format(event.order_id))
+
+                completions.append((event, assign_times.pop(event.order_id)))
+
+        if len(completions) == 0:
+            return
+
+        keys = set((event.courier_id, event.order.region) for event, assign_time in completions)
+
+        with transaction.atomic():
+            CourierRegionStat.objects.bulk_create(
+                [CourierRegionStat(courier_id=courier_id, region=region) for courier_id, region in keys],
+                ignore_conflicts=True
+            )
+            stats = {
+                (stat.courier_id, stat.region): stat
+                for stat in CourierRegionStat.objects.select_for_update().filter(
+                    courier_id__in=set(courier_id for courier_id, region in keys),
+                    region__in=set(region for courier_id, region in keys)
+                )
+                if (stat.courier_id, stat.region) in keys
+            }
+
+            for event, assign_time in completions:
+                CourierStatManager.add_completion(
+                    stats[(event.courier_id, event.order.region)], assign_time, to_datetime(event.time), event.cost
+                )
+
+            CourierRegionStat.objects.bulk_update(stats.values(), [
+                'total_cost', 'delivery_seconds', 'orders_count', 'last_assign_time', 'last_complete_time'
+            ])
+
+    @staticmethod
+    def add_completion(stat, assign_time, complete_time, cost):
+        if stat.last_assign_time == assign_time and stat.last_complete_time is not None:
+            started_time = stat.last_complete_time
+        else:
+            started_time = assign_time
+
+        stat.total_cost += cost or 0
+        stat.delivery_seconds += (complete_time - started_time).total_seconds()
+        stat.orders_count += 1
+        stat.last_assign_time = assign_time
+        stat.last_complete_time = complete_time
+
+        return stat
+
+
+class ReassignmentManager:
+    LOCK_TIMEOUT = timedelta(minutes=5)
+
+    @staticmethod
+    def push(courier_id):
+        job, _ = ReassignmentJob.objects.update_or_create(
+            courier_id=courier_id,
+            defaults={"requested_at": datetime.now()}
         )
+
+        return job
+
+    @staticmethod
+    def claim(limit):
+        now = datetime.now()
+        jobs = ReassignmentJob.objects \
+            .filter(Q(locked_at__isnull=True) | Q(locked_at__lt=now - ReassignmentManager.LOCK_TIMEOUT)) \
+            .order_by('requested_at')[:limit]
+        claimed_jobs = []
+
+        for job in jobs:
+            if ReassignmentJob.objects.filter(pk=job.pk, locked_at=job.locked_at).update(locked_at=now) == 1:
+                job.locked_at = now
+                claimed_jobs.append(job)
+
+        return claimed_jobs
+
+    @staticmethod
+    def process(job):
+        with transaction.atomic():
+            courier = Courier.objects.select_for_update().filter(courier_id=job.courier_id).first()
+
+            if courier is not None:
+                CourierManager.reassign_orders(courier)
+
+        if ReassignmentJob.objects.filter(pk=job.pk, requested_at=job.requested_at).delete()[0] == 0:
+            ReassignmentJob.objects.filter(pk=job.pk).update(locked_at=None)
+
+    @staticmethod
+    def run_pending(limit=100):
+        jobs = ReassignmentManager.claim(limit)
+
+        for job in jobs:
+            ReassignmentManager.process(job)
+
+        return len(jobs)
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0008_auto_20210323_1656'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['region', 'weight'], name='order_region_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdeliveryhour',
+            index=models.Index(fields=['order', 'start_time', 'end_time'], name='delivery_hour_order_time_idx'),
+        ),
+    ]
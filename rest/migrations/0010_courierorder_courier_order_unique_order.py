@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0009_auto_20261018_1358'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='courierorder',
+            constraint=models.UniqueConstraint(fields=('order',), name='courier_order_unique_order'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_courier_region_stats(apps, schema_editor):
+    CourierOrder = apps.get_model('rest', 'CourierOrder')
+    CourierRegionStat = apps.get_model('rest', 'CourierRegionStat')
+
+    stats = {}
+    courier_orders = CourierOrder.objects \
+        .filter(assign_time__isnull=False, complete_time__isnull=False) \
+        .values_list('courier_id', 'order__region', '_cost', 'assign_time', 'complete_time') \
+        .order_by('courier_id', 'order__region', 'assign_time', 'complete_time')
+
+    for courier_id, region, cost, assign_time, complete_time in courier_orders.iterator():
+        stat = stats.setdefault((courier_id, region), CourierRegionStat(courier_id=courier_id, region=region))
+
+        if stat.last_assign_time == assign_time and stat.last_complete_time is not None:
+            started_time = stat.last_complete_time
+        else:
+            started_time = assign_time
+
+        stat.total_cost += cost or 0
+        stat.delivery_seconds += (complete_time - started_time).total_seconds()
+        stat.orders_count += 1
+        stat.last_assign_time = assign_time
+        stat.last_complete_time = complete_time
+
+    CourierRegionStat.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0010_courierorder_courier_order_unique_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierRegionStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.IntegerField()),
+                ('total_cost', models.IntegerField(default=0)),
+                ('delivery_seconds', models.FloatField(default=0)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('last_assign_time', models.DateTimeField(blank=True, null=True)),
+                ('last_complete_time', models.DateTimeField(blank=True, null=True)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest.courier')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='courierregionstat',
+            constraint=models.UniqueConstraint(fields=('courier', 'region'), name='courier_region_stat_unique'),
+        ),
+        migrations.RunPython(fill_courier_region_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0011_courierregionstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReassignmentJob',
+            fields=[
+                ('courier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='rest.courier')),
+                ('requested_at', models.DateTimeField()),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:08
+
+from datetime import time
+
+from django.db import migrations, models
+
+HOUR_MODELS = ['CourierWorkingHour', 'OrderDeliveryHour']
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60) if minutes < 24 * 60 else time.max
+
+
+def fill_minutes(apps, schema_editor):
+    for model_name in HOUR_MODELS:
+        model = apps.get_model('rest', model_name)
+        items = list(model.objects.only('start_time', 'end_time'))
+
+        for item in items:
+            item.start_minute = to_minutes(item.start_time)
+            item.end_minute = to_minutes(item.end_time)
+
+        model.objects.bulk_update(items, ['start_minute', 'end_minute'], batch_size=1000)
+
+
+def fill_times(apps, schema_editor):
+    for model_name in HOUR_MODELS:
+        model = apps.get_model('rest', model_name)
+        items = list(model.objects.only('start_minute', 'end_minute'))
+
+        for item in items:
+            item.start_time = to_time(item.start_minute)
+            item.end_time = to_time(item.end_minute)
+
+        model.objects.bulk_update(items, ['start_time', 'end_time'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0012_reassignmentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courierworkinghour',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='courierworkinghour',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderdeliveryhour',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderdeliveryhour',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_minutes, fill_times),
+        migrations.RemoveIndex(
+            model_name='orderdeliveryhour',
+            name='delivery_hour_order_time_idx',
+        ),
+        migrations.RemoveField(
+            model_name='courierworkinghour',
+            name='start_time',
+        ),
+        migrations.RemoveField(
+            model_name='courierworkinghour',
+            name='end_time',
+        ),
+        migrations.RemoveField(
+            model_name='orderdeliveryhour',
+            name='start_time',
+        ),
+        migrations.RemoveField(
+            model_name='orderdeliveryhour',
+            name='end_time',
+        ),
+        migrations.AddIndex(
+            model_name='courierworkinghour',
+            index=models.Index(fields=['courier', 'start_minute', 'end_minute'], name='working_hour_courier_min_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdeliveryhour',
+            index=models.Index(fields=['order', 'start_minute', 'end_minute'], name='delivery_hour_order_min_idx'),
+        ),
+    ]
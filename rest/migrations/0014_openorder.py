@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_open_orders(apps, schema_editor):
+    Order = apps.get_model('rest', 'Order')
+    OpenOrder = apps.get_model('rest', 'OpenOrder')
+
+    orders = Order.objects.filter(courierorder__isnull=True).values_list('order_id', 'region', 'weight')
+
+    OpenOrder.objects.bulk_create(
+        [OpenOrder(order_id=order_id, region=region, weight=weight) for order_id, region, weight in orders.iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0013_hour_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenOrder',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='rest.order')),
+                ('region', models.IntegerField()),
+                ('weight', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='openorder',
+            index=models.Index(fields=['region', 'weight'], name='open_order_region_weight_idx'),
+        ),
+        migrations.RunPython(fill_open_orders, migrations.RunPython.noop),
+    ]
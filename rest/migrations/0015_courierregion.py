@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def get_regions(regions):
+    """ Старые записи могли сохранить в regions что угодно: берем только значения, приводимые к int """
+    result = []
+
+    for region in regions if isinstance(regions, list) else [regions]:
+        try:
+            result.append(int(region))
+        except (TypeError, ValueError):
+            continue
+
+    return dict.fromkeys(result)
+
+
+def fill_courier_regions(apps, schema_editor):
+    Courier = apps.get_model('rest', 'Courier')
+    CourierRegion = apps.get_model('rest', 'CourierRegion')
+
+    CourierRegion.objects.bulk_create(
+        [
+            CourierRegion(courier_id=courier_id, region=region)
+            for courier_id, regions in Courier.objects.values_list('courier_id', 'regions').iterator()
+            for region in get_regions(regions)
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0014_openorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierRegion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.IntegerField()),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest.courier')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='courierregion',
+            index=models.Index(fields=['region', 'courier'], name='courier_region_region_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='courierregion',
+            constraint=models.UniqueConstraint(fields=('courier', 'region'), name='courier_region_unique'),
+        ),
+        migrations.RunPython(fill_courier_regions, migrations.RunPython.noop),
+    ]
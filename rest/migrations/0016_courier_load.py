@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_courier_load(apps, schema_editor):
+    Courier = apps.get_model('rest', 'Courier')
+
+    couriers = list(Courier.objects.annotate(actual_load=Coalesce(
+        Sum('courierorder__order__weight', filter=Q(courierorder__complete_time__isnull=True)), 0.0
+    )))
+
+    for courier in couriers:
+        courier.load = courier.actual_load
+
+    Courier.objects.bulk_update(couriers, ['load'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0015_courierregion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='load',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_courier_load, migrations.RunPython.noop),
+    ]
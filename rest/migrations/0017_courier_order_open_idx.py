@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0016_courier_load'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courierorder',
+            index=models.Index(condition=models.Q(('complete_time__isnull', True)), fields=['courier', 'assign_time'], name='courier_order_open_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:23
+
+from datetime import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def fill_order_events(apps, schema_editor):
+    """
+    Журнал для уже существующих заказов: создание, затем назначения по времени назначения и завершения
+    по времени завершения; история снятий с курьеров до появления журнала не сохранилась
+    """
+    Order = apps.get_model('rest', 'Order')
+    CourierOrder = apps.get_model('rest', 'CourierOrder')
+    OrderEvent = apps.get_model('rest', 'OrderEvent')
+    RegionBacklog = apps.get_model('rest', 'RegionBacklog')
+
+    now = datetime.now()
+
+    OrderEvent.objects.bulk_create(
+        (OrderEvent(order_id=order_id, kind='created', time=now) for order_id in
+         Order.objects.order_by('order_id').values_list('order_id', flat=True).iterator()),
+        batch_size=1000
+    )
+    OrderEvent.objects.bulk_create(
+        (OrderEvent(order_id=order_id, courier_id=courier_id, kind='assigned', time=assign_time)
+         for order_id, courier_id, assign_time in CourierOrder.objects
+         .order_by('assign_time', 'id')
+         .values_list('order_id', 'courier_id', 'assign_time')
+         .iterator()),
+        batch_size=1000
+    )
+    OrderEvent.objects.bulk_create(
+        (OrderEvent(order_id=order_id, courier_id=courier_id, kind='completed', time=complete_time, cost=cost)
+         for order_id, courier_id, complete_time, cost in CourierOrder.objects
+         .filter(complete_time__isnull=False)
+         .order_by('complete_time', 'id')
+         .values_list('order_id', 'courier_id', 'complete_time', '_cost')
+         .iterator()),
+        batch_size=1000
+    )
+
+    backlogs = Order.objects \
+        .values('region') \
+        .annotate(
+            open_orders=Count('order_id', filter=Q(courierorder__isnull=True)),
+            open_weight=Sum('weight', filter=Q(courierorder__isnull=True)),
+            assigned_orders=Count('order_id', filter=Q(
+                courierorder__isnull=False, courierorder__complete_time__isnull=True
+            ))
+        ) \
+        .values_list('region', 'open_orders', 'open_weight', 'assigned_orders')
+
+    RegionBacklog.objects.bulk_create([
+        RegionBacklog(
+            region=region,
+            open_orders=open_orders,
+            open_weight=open_weight or 0,
+            assigned_orders=assigned_orders
+        ) for region, open_orders, open_weight, assigned_orders in backlogs
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0017_courier_order_open_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionBacklog',
+            fields=[
+                ('region', models.IntegerField(primary_key=True, serialize=False)),
+                ('open_orders', models.IntegerField(default=0)),
+                ('open_weight', models.FloatField(default=0)),
+                ('assigned_orders', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'created'), ('assigned', 'assigned'), ('unassigned', 'unassigned'), ('completed', 'completed')], max_length=10)),
+                ('time', models.DateTimeField()),
+                ('cost', models.IntegerField(blank=True, null=True)),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rest.courier')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest.order')),
+            ],
+        ),
+        migrations.RunPython(fill_order_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:41
+
+from django.db import migrations
+
+TYPES_COEFFICIENT = {
+    'foot': 2,
+    'bike': 5,
+    'car': 9,
+}
+
+
+def fill_costs(apps, schema_editor):
+    CourierOrder = apps.get_model('rest', 'CourierOrder')
+
+    for courier_type, coefficient in TYPES_COEFFICIENT.items():
+        CourierOrder.objects \
+            .filter(cost__isnull=True, courier__courier_type=courier_type) \
+            .update(cost=500 * coefficient)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest', '0018_orderevent_regionbacklog'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='courierorder',
+            old_name='_cost',
+            new_name='cost',
+        ),
+        migrations.RunPython(fill_costs, migrations.RunPython.noop),
+    ]
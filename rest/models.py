@@ -1,5 +1,6 @@
 from django.db import models
-from django.db.models import Sum
+
+from rest.intervals import format_interval, to_time
 
 
 class Courier(models.Model):
@@ -13,9 +14,18 @@ class Courier(models.Model):
         (TYPE_CAR, 50),
     ]
 
+    # Коэффициент оплаты доставленного заказа (см. CourierOrder.BASE_COST)
+    TYPES_COEFFICIENT = {
+        TYPE_FOOT: 2,
+        TYPE_BIKE: 5,
+        TYPE_CAR: 9,
+    }
+
     courier_id = models.IntegerField(primary_key=True, unique=True, null=False, blank=False)
     courier_type = models.CharField(choices=TYPES_WEIGHT, null=False, blank=False, max_length=10)
     regions = models.JSONField(null=False, blank=False)
+    # Суммарный вес назначенных и еще не доставленных заказов, поддерживается менеджерами
+    load = models.FloatField(null=False, blank=False, default=0)
 
     def is_foot_type(self):
         return self.courier_type == self.TYPE_FOOT
@@ -30,70 +40,172 @@ class Courier(models.Model):
         return dict(self.TYPES_WEIGHT)[str(self.courier_type)]
 
     def get_working_hours(self):
-        hours = []
-        for item in CourierWorkingHour.objects.filter(courier=self).all():
-            hours.append("{}-{}".format(item.start_time.strftime("%H:%M"), item.end_time.strftime("%H:%M")))
-
-        return hours
+        # Через related manager, чтобы использовать prefetch_related, если он был сделан
+        return [item.get_interval() for item in self.courierworkinghour_set.all()]
 
     def get_free_weight(self):
-        assigned_orders_weight = CourierOrder.objects \
-            .filter(courier=self, complete_time__isnull=True) \
-            .values('order__weight') \
-            .aggregate(Sum('order__weight'))['order__weight__sum']
-
-        return max(0, self.get_max_weight() - (0 if assigned_orders_weight is None else assigned_orders_weight))
+        return max(0, self.get_max_weight() - self.load)
 
     def get_coefficient(self):
-        if self.is_foot_type():
-            c = 2
-        elif self.is_bike_type():
-            c = 5
-        else:
-            c = 9
-
-        return c
+        return self.TYPES_COEFFICIENT[str(self.courier_type)]
 
     def get_assigned_orders(self):
         return CourierOrder.objects.filter(courier=self, complete_time__isnull=True)
 
 
+class CourierRegion(models.Model):
+    """ Нормализованная копия Courier.regions для индексируемых запросов по региону """
+
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE)
+    region = models.IntegerField(null=False, blank=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'region'], name='courier_region_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['region', 'courier'], name='courier_region_region_idx'),
+        ]
+
+
 class Order(models.Model):
     order_id = models.IntegerField(primary_key=True, unique=True, null=False, blank=False)
     weight = models.FloatField(null=False, blank=False)
     region = models.IntegerField(null=False, blank=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['region', 'weight'], name='order_region_weight_idx'),
+        ]
+
     def get_delivery_hours(self):
-        hours = []
-        for item in OrderDeliveryHour.objects.filter(order=self).all():
-            hours.append("{}-{}".format(item.start_time.strftime("%H:%M"), item.end_time.strftime("%H:%M")))
+        return [item.get_interval() for item in self.orderdeliveryhour_set.all()]
+
+
+class HourInterval(models.Model):
+    """ Интервал времени в минутах от начала суток; конец меньше начала - интервал через полночь """
+
+    start_minute = models.PositiveSmallIntegerField(blank=False, null=False)
+    end_minute = models.PositiveSmallIntegerField(blank=False, null=False)
+
+    class Meta:
+        abstract = True
 
-        return hours
+    @property
+    def start_time(self):
+        return to_time(self.start_minute)
+
+    @property
+    def end_time(self):
+        return to_time(self.end_minute)
 
+    def get_interval(self):
+        return format_interval(self.start_minute, self.end_minute)
 
-class CourierWorkingHour(models.Model):
+
+class CourierWorkingHour(HourInterval):
     courier = models.ForeignKey(Courier, on_delete=models.CASCADE)
-    start_time = models.TimeField(blank=False, null=False)
-    end_time = models.TimeField(blank=False, null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['courier', 'start_minute', 'end_minute'], name='working_hour_courier_min_idx'),
+        ]
 
 
-class OrderDeliveryHour(models.Model):
+class OrderDeliveryHour(HourInterval):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
-    start_time = models.TimeField(blank=False, null=False)
-    end_time = models.TimeField(blank=False, null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'start_minute', 'end_minute'], name='delivery_hour_order_min_idx'),
+        ]
+
+
+class OpenOrder(models.Model):
+    """ Пул еще не назначенных заказов: копия региона и веса для поиска кандидатов по индексу """
+
+    order = models.OneToOneField(Order, primary_key=True, on_delete=models.CASCADE)
+    region = models.IntegerField(null=False, blank=False)
+    weight = models.FloatField(null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['region', 'weight'], name='open_order_region_weight_idx'),
+        ]
 
 
 class CourierOrder(models.Model):
+    BASE_COST = 500
+
     courier = models.ForeignKey(Courier, on_delete=models.CASCADE)
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     assign_time = models.DateTimeField(blank=False, null=False)
     complete_time = models.DateTimeField(blank=True, null=True)
-    _cost = models.IntegerField(blank=True, null=True, db_column='cost', default=None)
+    # Оплата за заказ, фиксируется при назначении: BASE_COST * коэффициент типа курьера на тот момент
+    cost = models.IntegerField(blank=True, null=True, db_column='cost', default=None)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order'], name='courier_order_unique_order'),
+        ]
+        indexes = [
+            # Открытые заказы курьера: свободный вес, время последнего назначения, перераспределение
+            models.Index(
+                fields=['courier', 'assign_time'],
+                name='courier_order_open_idx',
+                condition=models.Q(complete_time__isnull=True)
+            ),
+        ]
+
+
+class OrderEvent(models.Model):
+    """ Журнал жизненного цикла заказа, только дописывается; из него строятся проекции (см. ProjectionManager) """
+
+    KIND_CREATED = 'created'
+    KIND_ASSIGNED = 'assigned'
+    KIND_UNASSIGNED = 'unassigned'
+    KIND_COMPLETED = 'completed'
+
+    KINDS = [
+        (KIND_CREATED, 'created'),
+        (KIND_ASSIGNED, 'assigned'),
+        (KIND_UNASSIGNED, 'unassigned'),
+        (KIND_COMPLETED, 'completed'),
+    ]
 
-    @property
-    def cost(self):
-        return self._cost
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, blank=True, null=True)
+    kind = models.CharField(choices=KINDS, null=False, blank=False, max_length=10)
+    # Время события: назначения для assigned, завершения для completed, записи для остальных
+    time = models.DateTimeField(blank=False, null=False)
+    cost = models.IntegerField(blank=True, null=True)
+
+
+class CourierRegionStat(models.Model):
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE)
+    region = models.IntegerField(null=False, blank=False)
+    total_cost = models.IntegerField(null=False, blank=False, default=0)
+    delivery_seconds = models.FloatField(null=False, blank=False, default=0)
+    orders_count = models.IntegerField(null=False, blank=False, default=0)
+    last_assign_time = models.DateTimeField(blank=True, null=True)
+    last_complete_time = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'region'], name='courier_region_stat_unique'),
+        ]
+
+
+class ReassignmentJob(models.Model):
+    courier = models.OneToOneField(Courier, on_delete=models.CASCADE, primary_key=True)
+    requested_at = models.DateTimeField(blank=False, null=False)
+    locked_at = models.DateTimeField(blank=True, null=True)
+
+
+class RegionBacklog(models.Model):
+    """ Проекция журнала: нераспределенные и назначенные заказы региона """
 
-    @cost.setter
-    def cost(self, value):
-        self._cost = 500 * self.courier.get_coefficient()
+    region = models.IntegerField(primary_key=True)
+    open_orders = models.IntegerField(null=False, blank=False, default=0)
+    open_weight = models.FloatField(null=False, blank=False, default=0)
+    assigned_orders = models.IntegerField(null=False, blank=False, default=0)
@@ -1,18 +1,43 @@
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.validators import UniqueValidator
 
+from rest.intervals import parse_interval
 from rest.managers import OrderManager, CourierManager
 from rest.models import Courier, CourierWorkingHour, Order
 
 
+def validate_intervals(value):
+    """ Список интервалов вида HH:MM-HH:MM """
+    if not isinstance(value, list):
+        raise ValidationError("Expected a list of HH:MM-HH:MM intervals")
+
+    for interval in value:
+        try:
+            parse_interval(interval)
+        except (ValueError, TypeError, AttributeError):
+            raise ValidationError("Invalid interval: {}".format(interval))
+
+
+def validate_regions(value):
+    """ Список целых номеров регионов """
+    if not isinstance(value, list):
+        raise ValidationError("Expected a list of integer regions")
+
+    for region in value:
+        if not isinstance(region, int) or isinstance(region, bool):
+            raise ValidationError("Invalid region: {}".format(region))
+
+
 class CourierSerializer(serializers.ModelSerializer):
     courier_id = serializers.IntegerField(
         required=True,
         allow_null=False,
         validators=[UniqueValidator(queryset=Courier.objects.all())]
     )
-    working_hours = serializers.JSONField(required=True, allow_null=False)
+    regions = serializers.JSONField(required=True, allow_null=False, validators=[validate_regions])
+    working_hours = serializers.JSONField(required=True, allow_null=False, validators=[validate_intervals])
 
     class Meta:
         model = Courier
@@ -24,6 +49,9 @@ class CourierSerializer(serializers.ModelSerializer):
             if unknown_keys:
                 raise ValidationError("Got unknown fields: {}".format(unknown_keys))
 
+        if self.partial and len(data) == 0:
+            raise ValidationError("Nothing to update")
+
         return data
 
     def create(self, validated_data):
@@ -37,21 +65,24 @@ class CourierSerializer(serializers.ModelSerializer):
         return courier
 
     def update(self, instance, validated_data):
-        if next(iter(validated_data)) == "working_hours":
-            working_hours = CourierWorkingHour.objects.filter(courier=instance)
-            working_hours.delete()
-
-            for data in next(iter(validated_data.values())):
-                hours = data.split("-")
-                CourierWorkingHour.objects.create(
-                    courier=instance,
-                    start_time=hours[0],
-                    end_time=hours[1]
-                )
-
-        instance.courier_type = validated_data.get("courier_type", instance.courier_type)
-        instance.regions = validated_data.get("regions", instance.regions)
-        instance.save()
+        with transaction.atomic(savepoint=False):
+            if "working_hours" in validated_data:
+                working_hours = CourierWorkingHour.objects.filter(courier=instance)
+                working_hours.delete()
+
+                for data in validated_data["working_hours"]:
+                    start_minute, end_minute = parse_interval(data)
+                    CourierWorkingHour.objects.create(
+                        courier=instance,
+                        start_minute=start_minute,
+                        end_minute=end_minute
+                    )
+
+            instance.courier_type = validated_data.get("courier_type", instance.courier_type)
+            instance.save(update_fields=['courier_type'])
+
+            if "regions" in validated_data:
+                CourierManager.set_regions(instance, validated_data["regions"])
 
         return instance
 
@@ -62,7 +93,7 @@ class OrderSerializer(serializers.ModelSerializer):
         allow_null=False,
         validators=[UniqueValidator(queryset=Order.objects.all())]
     )
-    delivery_hours = serializers.JSONField(required=True, allow_null=False)
+    delivery_hours = serializers.JSONField(required=True, allow_null=False, validators=[validate_intervals])
 
     class Meta:
         model = Order
@@ -85,3 +116,24 @@ class OrderSerializer(serializers.ModelSerializer):
         )
 
         return order
+
+
+class UnknownFieldsMixin:
+    """ Отклоняет элементы импорта с полями, которых нет в сериализаторе """
+
+    def to_internal_value(self, data):
+        validated_data = super().to_internal_value(data)
+
+        unknown_keys = set(data.keys()) - set(self.fields.keys())
+        if unknown_keys:
+            raise ValidationError("Got unknown fields: {}".format(unknown_keys))
+
+        return validated_data
+
+
+class CourierImportSerializer(UnknownFieldsMixin, CourierSerializer):
+    courier_id = serializers.IntegerField(required=True, allow_null=False)
+
+
+class OrderImportSerializer(UnknownFieldsMixin, OrderSerializer):
+    order_id = serializers.IntegerField(required=True, allow_null=False)
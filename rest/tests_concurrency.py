@@ -0,0 +1,202 @@
+import multiprocessing
+import random
+from unittest import mock, skipUnless
+
+from django.db import IntegrityError, connection, connections
+from django.db.models import Count, Sum
+from django.test import TransactionTestCase
+
+from rest.managers import CourierManager, OrderManager
+from rest.models import Courier, CourierOrder, OpenOrder
+
+WORKERS = 8
+COURIERS = 40
+ORDERS = 2000
+
+
+def assign_worker(seed):
+    courier_ids = list(range(1, COURIERS + 1))
+    random.Random(seed).shuffle(courier_ids)
+    assigned_order_ids = []
+
+    try:
+        for courier_id in courier_ids:
+            if seed % 2 == 0:
+                response = OrderManager.assign(courier_id)
+                assigned_order_ids += [order["id"] for order in response["orders"]]
+            else:
+                response = OrderManager.assign_batch(courier_ids[:5])
+                assigned_order_ids += [order["id"] for item in response["couriers"] for order in item["orders"]]
+                courier_ids = courier_ids[5:] + courier_ids[:5]
+    finally:
+        connections.close_all()
+
+    return assigned_order_ids
+
+
+@skipUnless(connection.vendor == 'postgresql', "Блокировки строк проверяются только на PostgreSQL")
+class ConcurrentAssignTestCase(TransactionTestCase):
+    """ Параллельное назначение заказов несколькими процессами """
+
+    def setUp(self) -> None:
+        rnd = random.Random(0)
+
+        CourierManager.bulk_create([
+            {
+                "courier_id": courier_id,
+                "courier_type": rnd.choice([Courier.TYPE_FOOT, Courier.TYPE_BIKE, Courier.TYPE_CAR]),
+                "regions": [1, 2],
+                "working_hours": ["09:00-18:00"]
+            } for courier_id in range(1, COURIERS + 1)
+        ])
+        OrderManager.bulk_create([
+            {
+                "order_id": order_id,
+                "weight": round(rnd.uniform(0.5, 3), 2),
+                "region": rnd.choice([1, 2]),
+                "delivery_hours": ["10:00-12:00"]
+            } for order_id in range(1, ORDERS + 1)
+        ])
+
+    def test_no_order_is_assigned_twice(self):
+        connections.close_all()
+
+        with multiprocessing.get_context('fork').Pool(WORKERS) as pool:
+            results = pool.map(assign_worker, range(WORKERS))
+
+        assigned_order_ids = [order_id for result in results for order_id in result]
+
+        self.assertEqual(len(assigned_order_ids), len(set(assigned_order_ids)))
+        self.assertEqual(len(assigned_order_ids), CourierOrder.objects.count())
+        self.assertFalse(CourierOrder.objects.values('order').annotate(count=Count('id')).filter(count__gt=1).exists())
+
+        for courier in Courier.objects.annotate(actual_load=Sum('courierorder__order__weight')):
+            self.assertLessEqual(courier.actual_load or 0, courier.get_max_weight() + 1e-6)
+            self.assertAlmostEqual(courier.actual_load or 0, courier.load)
+
+    def test_every_courier_gets_orders(self):
+        connections.close_all()
+
+        with multiprocessing.get_context('fork').Pool(WORKERS) as pool:
+            pool.map(assign_worker, range(WORKERS))
+
+        # Заказов в общих регионах больше, чем все курьеры могут взять: пустой ответ означал бы, что заказы
+        # достались не ему, а остались заблокированными соседним назначением
+        self.assertFalse(Courier.objects.filter(load=0).exists())
+
+
+def with_stale_pool(func, attempts=1):
+    """ Первые attempts вызовов видят заказ 1 свободным, как если бы его забрали уже после чтения пула """
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        if len(calls) < attempts:
+            OpenOrder.objects.create(order_id=1, region=1, weight=1)
+
+        calls.append(args)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class AssignRetryTestCase(TransactionTestCase):
+    """ Повтор назначения после нарушения уникальности CourierOrder.order
+
+    На SQLite запись сериализуется, и настоящая гонка заканчивается "database is locked", а не IntegrityError,
+    поэтому гонка воспроизводится устаревшим пулом заказов внутри транзакции назначения
+    """
+
+    def setUp(self) -> None:
+        CourierManager.bulk_create([
+            {
+                "courier_id": courier_id,
+                "courier_type": Courier.TYPE_FOOT,
+                "regions": [1],
+                "working_hours": ["09:00-18:00"]
+            } for courier_id in [1, 2]
+        ])
+        OrderManager.bulk_create([{"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["10:00-12:00"]}])
+        OrderManager.assign(2)
+
+    def test_assign_retries(self):
+        stale = with_stale_pool(OrderManager.get_orders_to_assign)
+
+        with mock.patch.object(OrderManager, 'get_orders_to_assign', side_effect=stale) as get_orders_to_assign:
+            response = OrderManager.assign(1)
+
+        self.assertEqual(2, get_orders_to_assign.call_count)
+        self.assertEqual([], response["orders"])
+        self.assertEqual(2, CourierOrder.objects.get(order_id=1).courier_id)
+        self.assertFalse(OpenOrder.objects.exists())
+
+    def test_assign_batch_retries(self):
+        stale = with_stale_pool(OrderManager.assign_orders_to_couriers)
+
+        with mock.patch.object(OrderManager, 'assign_orders_to_couriers', side_effect=stale) as assign_orders:
+            response = OrderManager.assign_batch([1])
+
+        self.assertEqual(2, assign_orders.call_count)
+        self.assertEqual([], response["couriers"][0]["orders"])
+        self.assertEqual(2, CourierOrder.objects.get(order_id=1).courier_id)
+        self.assertFalse(OpenOrder.objects.exists())
+
+    def test_assign_gives_up(self):
+        stale = with_stale_pool(OrderManager.get_orders_to_assign, attempts=OrderManager.ASSIGN_ATTEMPTS)
+
+        with mock.patch.object(OrderManager, 'get_orders_to_assign', side_effect=stale) as get_orders_to_assign:
+            with self.assertRaises(IntegrityError):
+                OrderManager.assign(1)
+
+        self.assertEqual(OrderManager.ASSIGN_ATTEMPTS, get_orders_to_assign.call_count)
+        self.assertEqual(1, CourierOrder.objects.count())
+
+
+class ClaimOrdersTestCase(TransactionTestCase):
+    """ Захват только выбранных заказов: занятые другим назначением заменяются оставшимися кандидатами """
+
+    def setUp(self) -> None:
+        CourierManager.bulk_create([
+            {
+                "courier_id": courier_id,
+                "courier_type": Courier.TYPE_FOOT,
+                "regions": [1],
+                "working_hours": ["09:00-18:00"]
+            } for courier_id in [1, 2]
+        ])
+        OrderManager.bulk_create([
+            {"order_id": order_id, "weight": weight, "region": 1, "delivery_hours": ["10:00-12:00"]}
+            for order_id, weight in [(1, 6), (2, 4), (3, 3), (4, 2)]
+        ])
+
+    def held_by_other_worker(self, *held_order_ids):
+        claim_orders = OrderManager.claim_orders
+
+        def wrapper(order_ids):
+            return claim_orders(order_ids) - set(held_order_ids)
+
+        return wrapper
+
+    def test_assign_tops_up(self):
+        with mock.patch.object(OrderManager, 'claim_orders', side_effect=self.held_by_other_worker(1)) as claim:
+            response = OrderManager.assign(1)
+
+        self.assertEqual(2, claim.call_count)
+        self.assertEqual([2, 3, 4], sorted(order["id"] for order in response["orders"]))
+        self.assertEqual([1], list(OpenOrder.objects.values_list('order_id', flat=True)))
+
+    def test_assign_batch_tops_up(self):
+        with mock.patch.object(OrderManager, 'claim_orders', side_effect=self.held_by_other_worker(1)) as claim:
+            response = OrderManager.assign_batch([1, 2])
+
+        self.assertEqual(2, claim.call_count)
+        self.assertEqual(
+            [2, 3, 4], sorted(order["id"] for item in response["couriers"] for order in item["orders"])
+        )
+        self.assertEqual([1], list(OpenOrder.objects.values_list('order_id', flat=True)))
+
+    def test_everything_held(self):
+        with mock.patch.object(OrderManager, 'claim_orders', side_effect=self.held_by_other_worker(1, 2, 3, 4)):
+            response = OrderManager.assign(1)
+
+        self.assertEqual([], response["orders"])
+        self.assertFalse(CourierOrder.objects.exists())
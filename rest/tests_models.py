@@ -1,9 +1,23 @@
 import datetime
+import importlib
+import re
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-from django.test import TestCase
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from rest.managers import CourierOrderManager, CourierManager, OrderManager
-from rest.models import Courier, Order, CourierOrder, CourierWorkingHour, OrderDeliveryHour
+from rest.assignment import AssignmentStrategy, GreedyStrategy, KnapsackStrategy, LightestFirstStrategy, get_strategy
+from rest.intervals import IntervalIndex, format_interval, parse_interval, to_minutes
+from rest.loadtest import LoadReport, ReplaySource
+from rest.managers import CourierOrderManager, CourierManager, OrderEventManager, OrderManager, ProjectionManager, \
+    ReassignmentManager
+from rest.models import Courier, Order, CourierOrder, CourierRegion, CourierRegionStat, CourierWorkingHour, \
+    OrderDeliveryHour, OrderEvent, OpenOrder, ReassignmentJob, RegionBacklog
 
 
 class CreateCourierTestCase(TestCase):
@@ -28,6 +42,22 @@ class CreateCourierTestCase(TestCase):
         self.assertEqual(datetime.time(18, 0), workingHours.end_time)
 
 
+class FillCourierRegionsTestCase(TestCase):
+    """ Перенос регионов старых курьеров в CourierRegion (миграция 0015) """
+
+    def test_legacy_regions(self):
+        migration = importlib.import_module('rest.migrations.0015_courierregion')
+        Courier.objects.create(courier_id=1, courier_type=Courier.TYPE_FOOT, regions=["a", "5", None, 7, 7])
+        Courier.objects.create(courier_id=2, courier_type=Courier.TYPE_FOOT, regions=3)
+
+        migration.fill_courier_regions(apps, None)
+
+        self.assertEqual(
+            [(1, 5), (1, 7), (2, 3)],
+            list(CourierRegion.objects.order_by('courier_id', 'region').values_list('courier_id', 'region'))
+        )
+
+
 class CreateOrderTestCase(TestCase):
     """ Создание сущности Заказ """
 
@@ -64,3 +94,455 @@ class CreateCourierOrderTestCase(TestCase):
         self.assertTrue(Courier.objects.filter(courier_id=3).exists())
         self.assertTrue(Order.objects.filter(order_id=5).exists())
         self.assertTrue(CourierOrder.objects.filter(order=order, courier=courier).exists())
+
+
+class GetOrdersToAssignTestCase(TestCase):
+    """ Выборка заказов для назначения курьеру """
+
+    def setUp(self) -> None:
+        self.courier = CourierManager.create(1, Courier.TYPE_FOOT, [1, 2], ["09:00-12:00", "14:00-16:00"])
+
+        OrderManager.create(1, 9, 1, ["11:00-13:00"])
+        OrderManager.create(2, 2, 2, ["15:00-18:00", "10:00-11:00"])
+        OrderManager.create(3, 2, 3, ["09:00-12:00"])
+        OrderManager.create(4, 11, 1, ["09:00-12:00"])
+        OrderManager.create(5, 1, 1, ["12:30-13:30"])
+        OrderManager.create(7, 3, 2, ["08:00-22:00"])
+        assigned_order = OrderManager.create(6, 1, 1, ["09:00-12:00"])
+
+        CourierOrderManager.create(self.courier, assigned_order)
+
+    def test(self):
+        orders = OrderManager.get_orders_to_assign(1)
+
+        self.assertEqual([2, 7, 1], [order.order_id for order in orders])
+
+    def test_query_count(self):
+        for order_id in range(100, 150):
+            OrderManager.create(order_id, 1, 1, ["09:00-12:00", "13:00-15:00"])
+
+        with self.assertNumQueries(3):
+            orders = OrderManager.get_orders_to_assign(1)
+
+        self.assertEqual(53, len(orders))
+
+    def test_without_working_hours(self):
+        CourierWorkingHour.objects.filter(courier=self.courier).delete()
+
+        self.assertEqual([], OrderManager.get_orders_to_assign(1))
+
+
+class IntervalIndexTestCase(TestCase):
+    """ Индекс интервалов рабочего времени """
+
+    def setUp(self) -> None:
+        self.index = IntervalIndex([(9 * 60, 12 * 60), (11 * 60, 13 * 60), (22 * 60, 2 * 60)])
+
+    def test_merge(self):
+        self.assertEqual([0, 9 * 60, 22 * 60], self.index.starts)
+        self.assertEqual([2 * 60, 13 * 60, 24 * 60], self.index.ends)
+
+    def test_overlaps(self):
+        self.assertTrue(self.index.overlaps(12 * 60 + 30, 14 * 60))
+        self.assertTrue(self.index.overlaps(8 * 60, 9 * 60))
+        self.assertTrue(self.index.overlaps(6 * 60, 20 * 60))
+        self.assertTrue(self.index.overlaps(23 * 60, 23 * 60 + 30))
+        self.assertTrue(self.index.overlaps(20 * 60, 0))
+        self.assertFalse(self.index.overlaps(13 * 60 + 1, 21 * 60 + 59))
+        self.assertFalse(IntervalIndex([]).overlaps(0, 24 * 60))
+
+    def test_parse_and_format(self):
+        self.assertEqual((22 * 60 + 30, 2 * 60), parse_interval("22:30-02:00"))
+        self.assertEqual("09:05-18:00", format_interval(9 * 60 + 5, 18 * 60))
+        self.assertRaises(ValueError, parse_interval, "25:00-26:00")
+
+    def test_sql_matches_python(self):
+        order = OrderManager.create(1, 1, 1, [])
+        windows = [
+            ("12:30", "14:00"), ("08:00", "09:00"), ("06:00", "20:00"), ("23:00", "23:30"),
+            ("20:00", "00:00"), ("13:01", "21:59"), ("03:00", "04:00"), ("21:00", "01:00")
+        ]
+
+        for start_time, end_time in windows:
+            OrderDeliveryHour.objects.create(
+                order=order,
+                start_minute=to_minutes(start_time),
+                end_minute=to_minutes(end_time)
+            )
+
+        matched = OrderDeliveryHour.objects.filter(self.index.as_q())
+        expected = [
+            "{}-{}".format(start_time, end_time) for start_time, end_time in windows
+            if self.index.overlaps(to_minutes(start_time), to_minutes(end_time))
+        ]
+
+        self.assertEqual(sorted(expected), sorted(item.get_interval() for item in matched))
+        self.assertEqual(6, len(expected))
+
+
+class AssignmentStrategyTestCase(TestCase):
+    """ Стратегии назначения заказов """
+
+    def setUp(self) -> None:
+        self.orders = [SimpleNamespace(order_id=i, weight=weight) for i, weight in enumerate([0.1, 0.2, 4.9, 5, 6])]
+
+    def select(self, strategy, free_weight):
+        return [order.order_id for order in strategy.select(self.orders, free_weight)]
+
+    def test_greedy(self):
+        self.assertEqual([4, 1, 0], self.select(GreedyStrategy(), 6.3))
+
+    def test_lightest_first(self):
+        self.assertEqual([2, 1, 0], self.select(LightestFirstStrategy(), 6.3))
+
+    def test_knapsack(self):
+        self.assertEqual([3, 2, 0], self.select(KnapsackStrategy(), 10))
+        self.assertEqual([4, 1, 0], self.select(KnapsackStrategy(), 6.3))
+        self.assertEqual([], self.select(KnapsackStrategy(), 0.05))
+
+    def test_knapsack_with_same_weights(self):
+        self.orders = [SimpleNamespace(order_id=i, weight=weight) for i, weight in enumerate([3.34] * 7 + [3.3])]
+
+        selected = KnapsackStrategy().select(self.orders, 10)
+        self.assertEqual(3, len(selected))
+        self.assertAlmostEqual(9.98, sum(order.weight for order in selected))
+
+    @override_settings(ASSIGNMENT_STRATEGIES={Courier.TYPE_FOOT: 'knapsack'})
+    def test_strategy_per_courier_type(self):
+        self.assertIsInstance(get_strategy(Courier.TYPE_FOOT), KnapsackStrategy)
+        self.assertIsInstance(get_strategy(Courier.TYPE_CAR), GreedyStrategy)
+
+    def test_strategy_without_select(self):
+        class IncompleteStrategy(AssignmentStrategy):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteStrategy()
+
+
+class ReassignOrdersTestCase(TestCase):
+    """ Снятие заказов с курьера после изменения его данных """
+
+    def setUp(self) -> None:
+        self.courier = CourierManager.create(1, Courier.TYPE_CAR, [1, 2], ["09:00-12:00"])
+
+        for order_id in range(1, 41):
+            order = OrderManager.create(order_id, 1, 1 if order_id % 2 else 2, ["10:00-11:00", "15:00-16:00"])
+            CourierOrderManager.create(self.courier, order)
+
+    def test_query_count(self):
+        CourierManager.set_regions(self.courier, [1])
+
+        with self.assertNumQueries(9):
+            deleted_ids = CourierManager.reassign_orders(self.courier)
+
+        self.assertEqual(20, len(deleted_ids))
+        self.assertEqual(20, self.courier.get_assigned_orders().count())
+        self.assertFalse(self.courier.get_assigned_orders().filter(order__region=2).exists())
+
+    def test_orders_without_hours_are_kept(self):
+        order = OrderManager.create(41, 1, 1, [])
+        CourierOrderManager.create(self.courier, order)
+
+        self.assertEqual([], CourierManager.reassign_orders(self.courier))
+
+        CourierWorkingHour.objects.filter(courier=self.courier).delete()
+        self.assertEqual([], CourierManager.reassign_orders(self.courier))
+        self.assertEqual(41, self.courier.get_assigned_orders().count())
+
+    def test_dropped_orders_return_to_pool(self):
+        self.assertFalse(OpenOrder.objects.exists())
+
+        CourierManager.set_regions(self.courier, [1])
+        CourierManager.reassign_orders(self.courier)
+
+        self.assertEqual(
+            list(range(2, 41, 2)),
+            list(OpenOrder.objects.filter(region=2).order_by('order_id').values_list('order_id', flat=True))
+        )
+        self.assertEqual(20, OpenOrder.objects.count())
+
+        response = OrderManager.assign(self.courier.courier_id)
+
+        self.assertEqual([], response["orders"])
+        self.assertEqual(20, OpenOrder.objects.count())
+
+
+class ReassignmentQueueTestCase(TestCase):
+    """ Очередь отложенного перераспределения заказов """
+
+    def setUp(self) -> None:
+        self.courier = CourierManager.create(1, Courier.TYPE_FOOT, [1], ["09:00-12:00"])
+        self.order = OrderManager.create(1, 2, 1, ["10:00-11:00"])
+        CourierOrderManager.create(self.courier, self.order)
+
+        CourierManager.set_regions(self.courier, [2])
+
+    def test_claim_is_exclusive(self):
+        ReassignmentManager.push(1)
+
+        self.assertEqual(1, len(ReassignmentManager.claim(10)))
+        self.assertEqual(0, len(ReassignmentManager.claim(10)))
+
+    def test_process(self):
+        ReassignmentManager.push(1)
+
+        self.assertEqual(1, ReassignmentManager.run_pending())
+        self.assertEqual(0, ReassignmentManager.run_pending())
+        self.assertFalse(CourierOrder.objects.filter(courier_id=1).exists())
+
+    def test_request_during_processing_is_kept(self):
+        ReassignmentManager.push(1)
+        job = ReassignmentManager.claim(10)[0]
+
+        ReassignmentManager.push(1)
+        ReassignmentManager.process(job)
+
+        self.assertTrue(ReassignmentJob.objects.filter(courier_id=1, locked_at__isnull=True).exists())
+
+
+class CourierLoadTestCase(TestCase):
+    """ Загрузка курьера поддерживается при назначении, завершении и снятии заказов """
+
+    def setUp(self) -> None:
+        CourierManager.create(1, Courier.TYPE_BIKE, [1, 2], ["09:00-18:00"])
+        OrderManager.create(1, 2.5, 1, ["10:00-11:00"])
+        OrderManager.create(2, 4, 2, ["10:00-11:00"])
+        OrderManager.create(3, 7, 1, ["10:00-11:00"])
+
+    def get_courier(self):
+        return Courier.objects.get(courier_id=1)
+
+    def test_load(self):
+        OrderManager.assign(1)
+        self.assertEqual(13.5, self.get_courier().load)
+        self.assertEqual(1.5, self.get_courier().get_free_weight())
+
+        OrderManager.complete(1, 1, "2021-01-10T10:33:01.42Z")
+        self.assertEqual(11, self.get_courier().load)
+
+        CourierManager.set_regions(self.get_courier(), [1])
+        CourierManager.reassign_orders(self.get_courier())
+        self.assertEqual(7, self.get_courier().load)
+        self.assertEqual([], CourierManager.get_load_mismatches())
+
+    def test_check_command(self):
+        OrderManager.assign(1)
+        Courier.objects.filter(courier_id=1).update(load=0)
+
+        self.assertEqual([(1, 0, 13.5)], CourierManager.get_load_mismatches())
+
+        call_command("check_courier_load", "--fix", stdout=StringIO())
+        self.assertEqual(13.5, self.get_courier().load)
+        self.assertEqual([], CourierManager.get_load_mismatches())
+
+    def test_check_command_with_concurrent_complete(self):
+        OrderManager.assign(1)
+        Courier.objects.filter(courier_id=1).update(load=0)
+        get_load_mismatches = CourierManager.get_load_mismatches
+
+        def complete_after_check():
+            mismatches = get_load_mismatches()
+            OrderManager.complete(1, 1, "2021-01-10T10:33:01.42Z")
+
+            return mismatches
+
+        with mock.patch.object(CourierManager, 'get_load_mismatches', side_effect=complete_after_check):
+            call_command("check_courier_load", "--fix", stdout=StringIO())
+
+        self.assertEqual(11, self.get_courier().load)
+        self.assertEqual([], CourierManager.get_load_mismatches())
+
+
+class OrderCostTestCase(TestCase):
+    """ Оплата заказа фиксируется при назначении по типу курьера """
+
+    def setUp(self) -> None:
+        CourierManager.create(1, Courier.TYPE_FOOT, [1], ["09:00-18:00"])
+        CourierManager.create(2, Courier.TYPE_BIKE, [1], ["09:00-18:00"])
+        CourierManager.create(3, Courier.TYPE_CAR, [1], ["09:00-18:00"])
+
+        for order_id in range(1, 7):
+            OrderManager.create(order_id, 4, 1, ["10:00-11:00"])
+
+    def test_cost(self):
+        OrderManager.assign_batch([1, 2, 3])
+
+        self.assertEqual(
+            {(1, 1000), (2, 2500), (3, 4500)},
+            set(CourierOrder.objects.values_list('courier_id', 'cost'))
+        )
+
+        Courier.objects.filter(courier_id=1).update(courier_type=Courier.TYPE_CAR)
+        order_ids = CourierOrder.objects.filter(courier_id=1).values_list('order_id', flat=True)
+
+        for order_id in order_ids:
+            OrderManager.complete(1, order_id, "2021-01-10T10:33:01.42Z")
+
+        info = CourierManager.get_info(Courier.objects.get(courier_id=1))
+        self.assertEqual(1000 * len(order_ids), info["earnings"])
+
+
+class OrderEventTestCase(TestCase):
+    """ Журнал событий заказа и проекции, построенные по нему """
+
+    def setUp(self) -> None:
+        CourierManager.create(1, Courier.TYPE_BIKE, [1, 2], ["09:00-18:00"])
+        CourierManager.create(2, Courier.TYPE_FOOT, [2], ["09:00-18:00"])
+        OrderManager.create(1, 2.5, 1, ["10:00-11:00"])
+        OrderManager.create(2, 4, 2, ["10:00-11:00"])
+        OrderManager.create(3, 7, 1, ["10:00-11:00"])
+        OrderManager.create(4, 1, 3, ["10:00-11:00"])
+
+        OrderManager.assign(1)
+        OrderManager.complete(1, 1, "2021-01-10T10:33:01.42Z")
+        CourierManager.set_regions(Courier.objects.get(courier_id=1), [1])
+        CourierManager.reassign_orders(Courier.objects.get(courier_id=1))
+        OrderManager.assign(2)
+
+    def get_projections(self):
+        return (
+            sorted(OpenOrder.objects.values_list('order_id', 'region', 'weight')),
+            sorted(RegionBacklog.objects.values_list('region', 'open_orders', 'open_weight', 'assigned_orders')),
+            sorted(CourierRegionStat.objects.values_list(
+                'courier_id', 'region', 'total_cost', 'delivery_seconds', 'orders_count'
+            )),
+        )
+
+    def test_history(self):
+        self.assertEqual(
+            [OrderEvent.KIND_CREATED, OrderEvent.KIND_ASSIGNED, OrderEvent.KIND_UNASSIGNED, OrderEvent.KIND_ASSIGNED],
+            [kind for kind, courier_id, time in OrderEventManager.get_history(2)]
+        )
+        self.assertEqual(
+            [None, 1, 1, 2],
+            [courier_id for kind, courier_id, time in OrderEventManager.get_history(2)]
+        )
+        self.assertEqual(
+            datetime.datetime(2021, 1, 10, 10, 33, 1, 420000),
+            OrderEventManager.get_history(1)[-1][2]
+        )
+
+    def test_region_backlog(self):
+        self.assertEqual([
+            (1, 0, 0, 1),
+            (2, 0, 0, 1),
+            (3, 1, 1, 0),
+        ], sorted(RegionBacklog.objects.values_list('region', 'open_orders', 'open_weight', 'assigned_orders')))
+
+    def test_rebuild(self):
+        projections = self.get_projections()
+
+        RegionBacklog.objects.all().delete()
+        OpenOrder.objects.all().delete()
+        CourierRegionStat.objects.all().update(orders_count=0)
+
+        out = StringIO()
+        call_command("rebuild_projections", "--batch-size", "3", stdout=out)
+
+        self.assertIn("Применено событий: {}".format(OrderEvent.objects.count()), out.getvalue())
+        self.assertEqual(projections, self.get_projections())
+
+    def test_rebuild_without_assignment(self):
+        OrderEvent.objects.filter(order_id=1, kind=OrderEvent.KIND_ASSIGNED).delete()
+
+        with self.assertRaisesMessage(ValueError, "нет назначения для завершенного заказа 1"):
+            ProjectionManager.rebuild()
+
+
+class QueryPlanTestCase(TestCase):
+    """ Горячие запросы не должны читать таблицы целиком """
+
+    def setUp(self) -> None:
+        for courier_id in range(1, 21):
+            CourierManager.create(courier_id, Courier.TYPE_CAR, [courier_id % 4, 10], ["09:00-18:00"])
+
+        for order_id in range(1, 201):
+            OrderManager.create(order_id, 1 + order_id % 5, order_id % 4, ["10:00-11:00"])
+
+        OrderManager.assign_batch(list(range(1, 5)))
+        OrderManager.complete(1, CourierOrder.objects.filter(courier_id=1).first().order_id, "2021-01-10T10:33:01.42Z")
+
+    def explain(self, sql):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+                try:
+                    cursor.execute("EXPLAIN " + sql)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                finally:
+                    cursor.execute("RESET enable_seqscan")
+
+            return plan, re.findall(r"Seq Scan on (rest_\w+)", plan)
+
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = "\n".join(row[-1] for row in cursor.fetchall())
+
+        # SQLite до 3.36 пишет "SCAN TABLE rest_x", новее - "SCAN rest_x"
+        return plan, [
+            table for table, rest in re.findall(r"\bSCAN (?:TABLE )?(rest_\w+)(.*)", plan) if "USING" not in rest
+        ]
+
+    def assertNoFullScan(self, func, *args):
+        """ Выполняет func и проверяет планы всех SELECT/UPDATE/DELETE, которые она отправила в базу """
+        with CaptureQueriesContext(connection) as context:
+            func(*args)
+
+        statements = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertGreater(len(statements), 0)
+
+        for sql in statements:
+            plan, full_scans = self.explain(sql)
+            self.assertEqual([], full_scans, "{}\n{}".format(sql, plan))
+
+    def test_hot_paths(self):
+        order_id = CourierOrder.objects.filter(courier_id=2, complete_time__isnull=True).first().order_id
+        courier = Courier.objects.get(courier_id=3)
+
+        self.assertNoFullScan(OrderManager.assign, 5)
+        self.assertNoFullScan(OrderManager.assign_batch, [6, 7])
+        self.assertNoFullScan(OrderManager.complete, 2, order_id, "2021-01-10T10:33:01.42Z")
+        self.assertNoFullScan(OrderManager.complete, 2, order_id, "2021-01-10T11:33:01.42Z")
+        self.assertNoFullScan(CourierManager.set_regions, courier, [3])
+        self.assertNoFullScan(CourierManager.reassign_orders, courier)
+        self.assertNoFullScan(CourierManager.get_info, Courier.objects.get(courier_id=1))
+
+
+class LoadTestToolsTestCase(TestCase):
+    """ Разбор журнала и отчет нагрузочного прогона """
+
+    def test_replay_source(self):
+        source = ReplaySource([
+            '{"method": "post", "path": "/orders/assign", "body": {"courier_id": 1}}',
+            '{"request_id": "user-001", "title": "..."}',
+            'not json',
+            '{"method": "GET", "path": "/couriers?region=1", "name": "couriers_list"}',
+        ])
+
+        self.assertEqual(2, source.skipped)
+        request = source.next_request()
+        self.assertEqual(
+            ("/orders/assign", "POST", {"courier_id": 1}),
+            (request["name"], request["method"], request["body"])
+        )
+        self.assertEqual("couriers_list", source.next_request()["name"])
+        self.assertIsNone(source.next_request())
+
+    def test_report(self):
+        report = LoadReport()
+
+        for latency in [0.5, 3, 3, 7, 12000]:
+            report.add("assign", 200, latency / 1000)
+
+        report.duration = 2
+        result = report.as_dict()
+
+        self.assertEqual(2.5, result["throughput_rps"])
+        self.assertEqual({"<=1": 1, "<=5": 2, "<=10": 1, ">5000": 1}, result["histogram_ms"])
+        self.assertEqual({"200": 5}, result["endpoints"]["assign"]["statuses"])
+        self.assertEqual(3, result["endpoints"]["assign"]["p50_ms"])
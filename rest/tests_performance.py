@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import time
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from rest.benchmarks import generate_couriers, generate_orders, percentile
+from rest.cache import CourierInfoCache
+from rest.managers import CourierManager, OrderManager
+from rest.models import CourierOrder
+
+# Объем данных задается окружением: PERF_COURIERS=10000 PERF_ORDERS=100000 для прогона на реальных объемах
+COURIERS = int(os.environ.get('PERF_COURIERS', 300))
+ORDERS = int(os.environ.get('PERF_ORDERS', 3000))
+REGIONS = max(5, COURIERS // 100)
+# Путь к JSON с p50/p95 задержками; без него замеры задержек пропускаются
+LATENCY_OUTPUT = os.environ.get('PERF_LATENCY_OUTPUT')
+LATENCY_REPEAT = int(os.environ.get('PERF_LATENCY_REPEAT', 50))
+
+client = APIClient()
+
+
+class PerformanceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CourierManager.bulk_create(generate_couriers(COURIERS, regions=REGIONS, seed=1), batch_size=1000)
+        OrderManager.bulk_create(generate_orders(ORDERS, regions=REGIONS, seed=2), batch_size=1000)
+        OrderManager.assign_batch(list(range(1, COURIERS // 2 + 1)))
+
+    def setUp(self) -> None:
+        caches[CourierInfoCache.ALIAS].clear()
+
+    def get_open_courier_order(self):
+        return CourierOrder.objects.filter(complete_time__isnull=True).order_by('id').first()
+
+
+class QueryBudgetTestCase(PerformanceTestCase):
+    """ Количество запросов каждого эндпоинта не зависит от объема данных """
+
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = func(*args, **kwargs)
+
+        self.assertLessEqual(
+            len(context.captured_queries),
+            budget,
+            "\n".join(query['sql'] for query in context.captured_queries)
+        )
+
+        return response
+
+    def test_import(self):
+        couriers = generate_couriers(100, start_id=COURIERS + 1, regions=REGIONS, seed=3)
+        orders = generate_orders(100, start_id=ORDERS + 1, regions=REGIONS, seed=4)
+
+        response = self.assertMaxQueries(6, client.post, reverse("couriers"), {"data": couriers}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.assertMaxQueries(9, client.post, reverse("orders"), {"data": orders}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_lists(self):
+        response = self.assertMaxQueries(2, client.get, reverse("couriers"), {"region": 1, "limit": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.assertMaxQueries(2, client.get, reverse("orders"), {"status": "assigned", "limit": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_courier(self):
+        courier_order = self.get_open_courier_order()
+        url = reverse("get_or_patch_courier", args=(courier_order.courier_id,))
+
+        response = self.assertMaxQueries(3, client.get, url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.assertMaxQueries(15, client.patch, url, {"regions": [1]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_assign(self):
+        response = self.assertMaxQueries(
+            14, client.post, reverse("orders_assign"), {"courier_id": COURIERS}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        courier_ids = list(range(COURIERS // 2 + 1, COURIERS // 2 + 51))
+        response = self.assertMaxQueries(
+            15, client.post, reverse("orders_assign_batch"), {"courier_ids": courier_ids}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_complete(self):
+        courier_order = self.get_open_courier_order()
+
+        response = self.assertMaxQueries(13, client.post, reverse("orders_complete"), {
+            "courier_id": courier_order.courier_id,
+            "order_id": courier_order.order_id,
+            "complete_time": "2021-01-10T10:33:01.42Z"
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@skipUnless(LATENCY_OUTPUT, "Задержки замеряются только при заданном PERF_LATENCY_OUTPUT")
+class LatencyTestCase(PerformanceTestCase):
+    """ Замер p50/p95 задержек эндпоинтов с выгрузкой в JSON для сравнения между прогонами """
+
+    def measure(self, name, request, expected_status):
+        timings = []
+
+        for attempt in range(LATENCY_REPEAT):
+            started_at = time.perf_counter()
+            response = request(attempt)
+            timings.append((time.perf_counter() - started_at) * 1000)
+
+            self.assertEqual(response.status_code, expected_status, name)
+
+        self.results[name] = {
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "samples": len(timings)
+        }
+
+    def test_latency(self):
+        rnd = random.Random(5)
+        self.results = {}
+        open_orders = list(
+            CourierOrder.objects.filter(complete_time__isnull=True).order_by('id')[:LATENCY_REPEAT]
+        )
+        couriers = generate_couriers(LATENCY_REPEAT * 10, start_id=COURIERS + 1, regions=REGIONS, seed=3)
+        orders = generate_orders(LATENCY_REPEAT * 10, start_id=ORDERS + 1, regions=REGIONS, seed=4)
+
+        self.measure("couriers", lambda attempt: client.post(
+            reverse("couriers"), {"data": couriers[attempt * 10:(attempt + 1) * 10]}, format="json"
+        ), status.HTTP_201_CREATED)
+        self.measure("orders", lambda attempt: client.post(
+            reverse("orders"), {"data": orders[attempt * 10:(attempt + 1) * 10]}, format="json"
+        ), status.HTTP_201_CREATED)
+        self.measure("get_or_patch_courier", lambda attempt: client.get(
+            reverse("get_or_patch_courier", args=(rnd.randint(1, COURIERS),))
+        ), status.HTTP_200_OK)
+        self.measure("orders_assign", lambda attempt: client.post(
+            reverse("orders_assign"), {"courier_id": rnd.randint(1, COURIERS)}, format="json"
+        ), status.HTTP_200_OK)
+        self.measure("orders_complete", lambda attempt: client.post(reverse("orders_complete"), {
+            "courier_id": open_orders[attempt % len(open_orders)].courier_id,
+            "order_id": open_orders[attempt % len(open_orders)].order_id,
+            "complete_time": "2021-01-10T10:33:01.42Z"
+        }, format="json"), status.HTTP_200_OK)
+
+        with open(LATENCY_OUTPUT, "w") as output:
+            json.dump({
+                "vendor": connection.vendor,
+                "couriers": COURIERS,
+                "orders": ORDERS,
+                "endpoints": self.results
+            }, output, indent=2)
@@ -1,12 +1,20 @@
 import datetime
+import json
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from rest.cache import CourierInfoCache
+from rest.importers import CourierImporter, NDJSON_CONTENT_TYPE
 from rest.managers import OrderManager, CourierManager, CourierOrderManager
-from rest.models import Courier, CourierWorkingHour
+from rest.models import Courier, CourierOrder, CourierRegion, CourierRegionStat, CourierWorkingHour, Order, \
+    OrderDeliveryHour, OrderEvent, ReassignmentJob
 
 client = APIClient()
 
@@ -75,6 +83,31 @@ class CreateCourierTestCase(TestCase):
             "couriers": [{"id": 1}]
         }})
 
+    def test_invalid_working_hours(self):
+        data = {"data": [
+            dict(self.valid_data["data"][0], working_hours=["bad"]),
+            dict(self.valid_data["data"][1], working_hours=["25:00-26:00"]),
+        ]}
+
+        response = client.post(reverse("couriers"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {
+            "couriers": [{"id": 1}, {"id": 2}]
+        }})
+
+    def test_invalid_regions(self):
+        data = {"data": [
+            dict(self.valid_data["data"][0], courier_id=courier_id, regions=regions)
+            for courier_id, regions in enumerate([["a"], 5, "abc", [None], [True], [1]], start=1)
+        ]}
+
+        response = client.post(reverse("couriers"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {
+            "couriers": [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}, {"id": 5}]
+        }})
+        self.assertFalse(Courier.objects.exists())
+
     def test_extra_field(self):
         response = client.post(reverse("couriers"), self.extra_field, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -82,6 +115,71 @@ class CreateCourierTestCase(TestCase):
             "couriers": [{"id": 4}]
         }})
 
+    def test_duplicate_ids_in_payload(self):
+        data = {"data": self.valid_data["data"] + [self.valid_data["data"][0]]}
+
+        response = client.post(reverse("couriers"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {
+            "couriers": [{"id": 1}]
+        }})
+
+    def test_nothing_saved_on_invalid_data(self):
+        CourierManager.create(1, Courier.TYPE_FOOT, [1, 22, 30], ["09:00-12:00"])
+
+        client.post(reverse("couriers"), self.invalid_data, format="json")
+        self.assertFalse(Courier.objects.filter(courier_id=3).exists())
+
+    def test_queries_do_not_depend_on_payload_size(self):
+        data = {"data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": Courier.TYPE_CAR,
+                "regions": [1, 2],
+                "working_hours": ["09:00-14:00", "15:00-20:00"]
+            } for courier_id in range(1, 101)
+        ]}
+
+        with self.assertNumQueries(6):
+            response = client.post(reverse("couriers"), data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CourierWorkingHour.objects.count(), 200)
+
+    def test_ndjson_stream(self):
+        body = "\n".join(json.dumps(data) for data in self.valid_data["data"])
+
+        with mock.patch.object(CourierImporter, "BATCH_SIZE", 1):
+            response = client.post(reverse("couriers"), body, content_type=NDJSON_CONTENT_TYPE)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"couriers": [{"id": 1}, {"id": 2}]})
+        self.assertEqual(CourierWorkingHour.objects.count(), 3)
+
+    def test_ndjson_stream_with_invalid_rows(self):
+        rows = self.valid_data["data"] + self.extra_field["data"] + [self.valid_data["data"][1]]
+        body = "\n".join(json.dumps(data) for data in rows) + "\n{broken"
+
+        with mock.patch.object(CourierImporter, "BATCH_SIZE", 2):
+            response = client.post(reverse("couriers"), body, content_type=NDJSON_CONTENT_TYPE)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {
+            "couriers": [{"id": 4}, {"id": 2}, {"id": None}]
+        }})
+        self.assertFalse(Courier.objects.exists())
+
+    def test_ndjson_stream_duplicate_after_invalid_row(self):
+        rows = self.extra_field["data"] + self.valid_data["data"][:1] + self.valid_data["data"][:1]
+        body = "\n".join(json.dumps(data) for data in rows)
+
+        with mock.patch.object(CourierImporter, "BATCH_SIZE", 2):
+            response = client.post(reverse("couriers"), body, content_type=NDJSON_CONTENT_TYPE)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {"couriers": [{"id": 4}, {"id": 1}]}})
+        self.assertFalse(Courier.objects.exists())
+
 
 class PatchCourierTestCase(TestCase):
     """ Тестируем обновление курьера по его ID """
@@ -126,6 +224,9 @@ class PatchCourierTestCase(TestCase):
             "regions": [15],
             "working_hours": ["09:00-12:00"]
         })
+        self.assertEqual(
+            list(CourierRegion.objects.filter(courier=self.courier).values_list('region', flat=True)), [15]
+        )
 
     def test_change_courier_working_hours(self):
         response = client.patch(reverse("get_or_patch_courier", args=(1,)), self.test_valid_data_3)
@@ -155,10 +256,39 @@ class PatchCourierTestCase(TestCase):
         response = client.patch(reverse("get_or_patch_courier", args=(2,)))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_invalid_working_hours(self):
+        response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"working_hours": ["09:00-24:30"]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(CourierWorkingHour.objects.filter(courier=self.courier).exists())
+
+    def test_invalid_regions(self):
+        response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"regions": ["a"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.courier.refresh_from_db()
+        self.assertEqual(self.courier.regions, [1, 22, 30])
+        self.assertEqual(CourierRegion.objects.filter(courier=self.courier).count(), 3)
+
     def test_bad_request(self):
         response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"stars": 1})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_regions_and_working_hours(self):
+        response = client.patch(
+            reverse("get_or_patch_courier", args=(1,)),
+            {"regions": [1], "working_hours": ["18:00-21:00"]},
+            format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["working_hours"], ["18:00-21:00"])
+        self.assertEqual(CourierWorkingHour.objects.filter(courier=self.courier).count(), 1)
+
+    async def test_empty_body(self):
+        response = await AsyncClient().patch(
+            reverse("get_or_patch_courier", args=(1,)), {}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_reassign_orders_after_change_regions(self):
         response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"regions": [3]})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -189,6 +319,18 @@ class PatchCourierTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(self.courier.get_assigned_orders().count(), 2)
 
+    @override_settings(REASSIGN_ASYNC=True)
+    def test_deferred_reassign(self):
+        client.patch(reverse("get_or_patch_courier", args=(1,)), {"regions": [3]})
+        response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"regions": [4]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.courier.get_assigned_orders().count(), 2)
+        self.assertEqual(ReassignmentJob.objects.count(), 1)
+
+        call_command("reassign_worker", "--once", stdout=StringIO())
+        self.assertEqual(self.courier.get_assigned_orders().count(), 0)
+        self.assertFalse(ReassignmentJob.objects.exists())
+
     def test_reassign_orders_after_change_type(self):
         response = client.patch(reverse("get_or_patch_courier", args=(1,)), {"courier_type": Courier.TYPE_FOOT})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -235,6 +377,15 @@ class CreateOrderTestCase(TestCase):
             "orders": [{"id": 1}, {"id": 2}]
         })
 
+    def test_invalid_delivery_hours(self):
+        data = {"data": [self.valid_data["data"][0], dict(self.valid_data["data"][1], delivery_hours=["12:00"])]}
+
+        response = client.post(reverse("orders"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {
+            "orders": [{"id": 2}]
+        }})
+
     def test_extra_fields(self):
         response = client.post(reverse("orders"), self.extra_fields)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -244,6 +395,43 @@ class CreateOrderTestCase(TestCase):
             }
         })
 
+    def test_existing_and_duplicate_ids(self):
+        OrderManager.create(2, 1, 32, ["09:00-12:00"])
+        data = {"data": self.valid_data["data"] + [self.valid_data["data"][0]]}
+
+        response = client.post(reverse("orders"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {
+            "validation_error": {
+                "orders": [{"id": 2}, {"id": 1}]
+            }
+        })
+        self.assertFalse(Order.objects.filter(order_id=1).exists())
+
+    def test_queries_do_not_depend_on_payload_size(self):
+        data = {"data": [
+            {
+                "order_id": order_id,
+                "weight": 1.5,
+                "region": 1,
+                "delivery_hours": ["09:00-12:00", "14:00-16:00"]
+            } for order_id in range(1, 101)
+        ]}
+
+        with self.assertNumQueries(9):
+            response = client.post(reverse("orders"), data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(OrderDeliveryHour.objects.count(), 200)
+
+    def test_ndjson_stream(self):
+        body = "\n".join(json.dumps(data) for data in self.valid_data["data"])
+
+        response = client.post(reverse("orders"), body, content_type=NDJSON_CONTENT_TYPE)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"orders": [{"id": 1}, {"id": 2}]})
+        self.assertEqual(OrderDeliveryHour.objects.count(), 3)
+
 
 class AssignOrdersTestCase(TestCase):
     """ Тестируем назначение заказов курьерам """
@@ -304,6 +492,61 @@ class AssignOrdersTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class AssignOrdersBatchTestCase(TestCase):
+    """ Тестируем назначение заказов нескольким курьерам за один запрос """
+
+    def setUp(self) -> None:
+        self.order_1 = OrderManager.create(1, 4, 1, ["09:00-12:00", "15:00-20:00"])
+        self.order_2 = OrderManager.create(2, 2.5, 22, ["09:00-22:00"])
+        self.order_3 = OrderManager.create(3, 3.5, 30, ["09:00-12:00"])
+        self.order_4 = OrderManager.create(4, 2, 1, ["09:00-12:00"])
+        self.order_5 = OrderManager.create(5, 8, 2, ["09:00-15:00"])
+
+        self.courier_1 = CourierManager.create(1, Courier.TYPE_FOOT, [1, 22, 30], ["09:00-12:00", "14:00-20:00"])
+        self.courier_2 = CourierManager.create(2, Courier.TYPE_BIKE, [22, 2], ["09:00-14:00"])
+        self.courier_3 = CourierManager.create(3, Courier.TYPE_CAR, [5], ["09:00-14:00"])
+
+    def test_assign(self):
+        response = client.post(reverse("orders_assign_batch"), {"courier_ids": [1, 2, 3]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["courier_id"] for item in response.data["couriers"]], [1, 2, 3])
+        self.assertEqual(response.data["couriers"][0]["orders"], [{"id": 1}, {"id": 3}, {"id": 2}])
+        self.assertEqual(response.data["couriers"][1]["orders"], [{"id": 5}])
+        self.assertEqual(response.data["couriers"][2], {"courier_id": 3, "orders": []})
+        self.assertEqual(self.courier_1.get_assigned_orders().count(), 3)
+        self.assertEqual(self.courier_2.get_assigned_orders().count(), 1)
+
+    def test_with_assigned_orders(self):
+        assign_time = datetime.datetime.now() - datetime.timedelta(hours=1)
+        CourierOrderManager.create(self.courier_2, self.order_1, assign_time)
+
+        response = client.post(reverse("orders_assign_batch"), {"courier_ids": [2, 1]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["couriers"][0]["orders"], [{"id": 5}, {"id": 2}])
+        self.assertEqual(response.data["couriers"][0]["assign_time"], assign_time.isoformat())
+        self.assertEqual(response.data["couriers"][1]["orders"], [{"id": 3}, {"id": 4}])
+
+    def test_query_count(self):
+        for courier_id in range(10, 30):
+            CourierManager.create(courier_id, Courier.TYPE_CAR, [1, 2], ["09:00-18:00"])
+
+        for order_id in range(10, 100):
+            OrderManager.create(order_id, 1, 2, ["10:00-11:00"])
+
+        with self.assertNumQueries(15):
+            response = client.post(reverse("orders_assign_batch"), {"courier_ids": list(range(10, 30))}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_incorrect_courier_ids(self):
+        response = client.post(reverse("orders_assign_batch"), {"courier_ids": [1, 7, 8]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {"couriers": [{"id": 7}, {"id": 8}]}})
+
+        response = client.post(reverse("orders_assign_batch"), {"courier_ids": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class CompleteOrderTestCase(TestCase):
     """ Тестируем завершение заказа """
 
@@ -323,6 +566,89 @@ class CompleteOrderTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {"order_id": 1})
 
+    def test_complete_updates_courier_stats(self):
+        response = client.post(reverse("orders_complete"), {
+            "courier_id": 1,
+            "order_id": 1,
+            "complete_time": (self.assign_time + datetime.timedelta(minutes=30)).isoformat() + "Z"
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stat = CourierRegionStat.objects.get(courier=self.courier, region=1)
+        self.assertEqual(stat.orders_count, 1)
+        self.assertEqual(stat.delivery_seconds, 30 * 60)
+        self.assertEqual(stat.total_cost, 500 * self.courier.get_coefficient())
+
+        response = client.get(reverse("get_or_patch_courier", args=(1,)))
+        self.assertEqual(response.json()["rating"], 2.5)
+
+    def test_repeated_complete(self):
+        complete_time = self.assign_time + datetime.timedelta(minutes=30)
+        data = {"courier_id": 1, "order_id": 1, "complete_time": complete_time.isoformat()}
+
+        with self.assertNumQueries(13):
+            response = client.post(reverse("orders_complete"), data, format="json")
+
+        self.assertEqual(response.data, {"order_id": 1})
+
+        data["complete_time"] = (complete_time + datetime.timedelta(hours=1)).isoformat()
+
+        with self.assertNumQueries(4):
+            response = client.post(reverse("orders_complete"), data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"order_id": 1})
+        self.assertEqual(CourierOrder.objects.get(order_id=1).complete_time, complete_time)
+        self.assertEqual(CourierRegionStat.objects.get(courier=self.courier, region=1).orders_count, 1)
+        self.assertEqual(Courier.objects.get(courier_id=1).load, 0)
+
+    def test_batch_complete(self):
+        CourierOrderManager.create(self.courier, OrderManager.create(2, 3, 22, ["09:00-12:00"]), self.assign_time)
+        CourierOrderManager.create(self.courier, OrderManager.create(3, 2, 30, ["09:00-12:00"]), self.assign_time)
+        OrderManager.complete(1, 3, self.assign_time + datetime.timedelta(minutes=5))
+
+        complete_time = (self.assign_time + datetime.timedelta(minutes=30)).isoformat()
+        data = [{"courier_id": 1, "order_id": order_id, "complete_time": complete_time} for order_id in [1, 2, 3, 2]]
+
+        response = client.post(reverse("orders_complete"), {"data": data + [{"courier_id": 1, "order_id": 4}]},
+                               format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"validation_error": {"orders": [{"id": 4}]}})
+        self.assertEqual(CourierOrder.objects.filter(complete_time__isnull=True).count(), 2)
+
+        response = client.post(reverse("orders_complete"), {"data": data}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"orders": [{"id": 1}, {"id": 2}, {"id": 3}]})
+        self.assertFalse(CourierOrder.objects.filter(complete_time__isnull=True).exists())
+        self.assertEqual(CourierRegionStat.objects.filter(courier=self.courier).aggregate(Sum("orders_count")), {
+            "orders_count__sum": 3
+        })
+        self.assertEqual(Courier.objects.get(courier_id=1).load, 0)
+
+        response = client.post(reverse("orders_complete"), {"data": data}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(OrderEvent.objects.filter(kind=OrderEvent.KIND_COMPLETED).count(), 3)
+
+    def test_batch_complete_out_of_order(self):
+        CourierOrderManager.create(self.courier, OrderManager.create(2, 3, 1, ["09:00-12:00"]), self.assign_time)
+
+        response = client.post(reverse("orders_complete"), {"data": [
+            {"courier_id": 1, "order_id": order_id, "complete_time": (self.assign_time + delta).isoformat()}
+            for order_id, delta in [(1, datetime.timedelta(minutes=30)), (2, datetime.timedelta(minutes=10))]
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stat = CourierRegionStat.objects.get(courier=self.courier, region=1)
+        self.assertEqual(stat.orders_count, 2)
+        self.assertEqual(stat.delivery_seconds, 30 * 60)
+
+    def test_not_an_object(self):
+        response = client.post(reverse("orders_complete"), [{"courier_id": 1, "order_id": 1}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = client.post(reverse("orders_complete"), {"courier_id": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_incorrect_data(self):
         response = client.post(reverse("orders_complete"), {
             "courier_id": 2,
@@ -399,7 +725,7 @@ class GetCourierTestCase(TestCase):
     def test_available_rating_and_earnings(self):
         response = client.get(reverse("get_or_patch_courier", args=(1,)))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, {
+        self.assertEqual(response.json(), {
             "courier_id": 1,
             "courier_type": Courier.TYPE_BIKE,
             "regions": [1, 20, 34],
@@ -411,10 +737,157 @@ class GetCourierTestCase(TestCase):
     def test_no_orders(self):
         response = client.get(reverse("get_or_patch_courier", args=(2,)))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, {
+        self.assertEqual(response.json(), {
             "courier_id": 2,
             "courier_type": Courier.TYPE_CAR,
             "regions": [15],
             "working_hours": ["09:00-14:00"],
             "earnings": 0
         })
+
+    async def test_async_client(self):
+        response = await AsyncClient().get(reverse("get_or_patch_courier", args=(2,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["courier_id"], 2)
+
+        response = await AsyncClient().get(reverse("get_or_patch_courier", args=(22,)))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_head(self):
+        response = await AsyncClient().head(reverse("get_or_patch_courier", args=(2,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = await AsyncClient().head(reverse("get_or_patch_courier", args=(22,)))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_patch_without_csrf_token(self):
+        response = APIClient(enforce_csrf_checks=True).patch(
+            reverse("get_or_patch_courier", args=(2,)), {"regions": [1]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_query_count_does_not_depend_on_history(self):
+        now = datetime.datetime.now()
+
+        for order_id in range(10, 60):
+            order = OrderManager.create(order_id, 1, 20, ["09:00-12:00"])
+            CourierOrderManager.create(self.courier_1, order, now, now + datetime.timedelta(minutes=order_id))
+
+        with self.assertNumQueries(3):
+            response = client.get(reverse("get_or_patch_courier", args=(1,)))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["earnings"], 54 * 500 * self.courier_1.get_coefficient())
+
+
+class ListTestCase(TestCase):
+    """ Тестируем получение списков курьеров и заказов """
+
+    def setUp(self) -> None:
+        for courier_id in range(1, 31):
+            CourierManager.create(
+                courier_id,
+                Courier.TYPE_FOOT if courier_id % 2 else Courier.TYPE_CAR,
+                [courier_id % 3, 10],
+                ["09:00-12:00", "14:00-18:00"]
+            )
+
+        for order_id in range(1, 31):
+            OrderManager.create(order_id, 1, 10, ["10:00-11:00", "15:00-16:00"])
+
+        courier = Courier.objects.get(courier_id=1)
+        now = datetime.datetime.now()
+
+        CourierOrderManager.create(courier, Order.objects.get(order_id=1), now)
+        CourierOrderManager.create(courier, Order.objects.get(order_id=2), now, now)
+
+    def test_couriers(self):
+        with self.assertNumQueries(2):
+            response = client.get(reverse("couriers"), {"limit": 20})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["couriers"]), 20)
+        self.assertEqual(response.data["couriers"][0], {
+            "courier_id": 1,
+            "courier_type": Courier.TYPE_FOOT,
+            "regions": [1, 10],
+            "working_hours": ["09:00-12:00", "14:00-18:00"]
+        })
+
+    def test_couriers_filter(self):
+        response = client.get(reverse("couriers"), {"region": 2, "type": Courier.TYPE_CAR, "offset": 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([courier["courier_id"] for courier in response.data["couriers"]], [8, 14, 20, 26])
+
+    def test_orders(self):
+        with self.assertNumQueries(2):
+            response = client.get(reverse("orders"), {"status": "new", "limit": 10, "offset": 5})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order["order_id"] for order in response.data["orders"]], list(range(8, 18)))
+        self.assertEqual(response.data["orders"][0]["delivery_hours"], ["10:00-11:00", "15:00-16:00"])
+
+        response = client.get(reverse("orders"), {"status": "assigned"})
+        self.assertEqual([order["order_id"] for order in response.data["orders"]], [1])
+
+        response = client.get(reverse("orders"), {"status": "completed"})
+        self.assertEqual([order["order_id"] for order in response.data["orders"]], [2])
+
+    def test_region_stats(self):
+        with self.assertNumQueries(1):
+            response = client.get(reverse("region_stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["regions"], [
+            {"region": 10, "open_orders": 28, "open_weight": 28, "assigned_orders": 1}
+        ])
+
+    def test_bad_params(self):
+        self.assertEqual(client.get(reverse("orders"), {"status": "lost"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(reverse("orders"), {"limit": 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(reverse("couriers"), {"type": "boat"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(client.get(reverse("couriers"), {"region": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CourierInfoCacheTestCase(TestCase):
+    """ Тестируем кеширование информации о курьере """
+
+    def setUp(self) -> None:
+        self.assign_time = datetime.datetime.now()
+        self.courier = CourierManager.create(1, Courier.TYPE_FOOT, [1], ["09:00-12:00"])
+        self.order = OrderManager.create(1, 4, 1, ["09:00-12:00"])
+        CourierOrderManager.create(self.courier, self.order, self.assign_time)
+
+    def test_hit_and_miss(self):
+        stats = CourierInfoCache.get_stats()
+        client.get(reverse("get_or_patch_courier", args=(1,)))
+
+        with self.assertNumQueries(0):
+            response = client.get(reverse("get_or_patch_courier", args=(1,)))
+
+        self.assertEqual(response.json()["courier_id"], 1)
+
+        response = client.get(reverse("cache_stats"))
+        self.assertEqual(response.data["couriers"]["hits"], stats["hits"] + 1)
+        self.assertEqual(response.data["couriers"]["misses"], stats["misses"] + 1)
+
+    def test_invalidate_on_patch(self):
+        client.get(reverse("get_or_patch_courier", args=(1,)))
+        client.patch(reverse("get_or_patch_courier", args=(1,)), {"regions": [1, 2]}, format="json")
+
+        response = client.get(reverse("get_or_patch_courier", args=(1,)))
+        self.assertEqual(response.json()["regions"], [1, 2])
+
+    def test_invalidate_on_complete(self):
+        response = client.get(reverse("get_or_patch_courier", args=(1,)))
+        self.assertEqual(response.json()["earnings"], 0)
+
+        client.post(reverse("orders_complete"), {
+            "courier_id": 1,
+            "order_id": 1,
+            "complete_time": self.assign_time + datetime.timedelta(minutes=10)
+        })
+
+        response = client.get(reverse("get_or_patch_courier", args=(1,)))
+        self.assertEqual(response.json()["earnings"], 500 * self.courier.get_coefficient())
@@ -1,27 +1,59 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import DatabaseError
+from django.http import HttpResponseNotFound, JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 
-from rest.managers import OrderManager, CourierManager
+from rest.cache import CourierInfoCache
+from rest.importers import CourierImporter, OrderImporter, is_ndjson, parse_ndjson
+from rest.managers import OrderManager, CourierManager, ReassignmentManager, RegionBacklogManager
 from rest.models import Courier
-from rest.serializers import CourierSerializer, OrderSerializer
+from rest.serializers import CourierSerializer
 
 
-@api_view(['POST'])
+PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+def get_pagination(request):
+    limit = int(request.query_params.get('limit', PAGE_LIMIT))
+    offset = int(request.query_params.get('offset', 0))
+
+    if not 0 < limit <= MAX_PAGE_LIMIT or offset < 0:
+        raise ValueError("Переданы некорректные параметры страницы")
+
+    return limit, offset
+
+
+@api_view(['GET', 'POST'])
 def couriers(request):
-    try:
-        not_valid_couriers = []
-        valid_couriers = []
+    if request.method == 'GET':
+        try:
+            limit, offset = get_pagination(request)
+            region = request.query_params.get('region')
+            courier_type = request.query_params.get('type')
 
-        for data in request.data['data']:
-            serializer = CourierSerializer(data=data)
+            if courier_type is not None and courier_type not in dict(Courier.TYPES_WEIGHT):
+                raise ValueError("Передан некорректный тип курьера")
 
-            if serializer.is_valid():
-                serializer.save()
-                valid_couriers.append({"id": serializer.validated_data["courier_id"]})
-            else:
-                not_valid_couriers.append({"id": data["courier_id"]})
+            return Response({
+                "couriers": CourierManager.get_list(
+                    region=None if region is None else int(region),
+                    courier_type=courier_type,
+                    limit=limit,
+                    offset=offset
+                )
+            }, status=status.HTTP_200_OK)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if is_ndjson(request):
+            valid_couriers, not_valid_couriers = CourierImporter.run_stream(parse_ndjson(request.stream))
+        else:
+            valid_couriers, not_valid_couriers = CourierImporter.run(request.data['data'])
 
         if len(not_valid_couriers) > 0:
             return Response({
@@ -36,47 +68,83 @@ def couriers(request):
         return Response(status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['PATCH', 'GET'])
-def get_or_patch_courier(request, courier_id):
+async def get_or_patch_courier(request, courier_id):
+    """ GET и HEAD обслуживаются асинхронно, остальные методы - синхронным DRF-представлением """
+    if request.method not in ('GET', 'HEAD'):
+        return await sync_to_async(patch_courier)(request, courier_id)
+
+    info = await sync_to_async(CourierManager.get_cached_info)(courier_id)
+
+    if info is None:
+        return HttpResponseNotFound()
+
+    return JsonResponse(info, status=status.HTTP_200_OK)
+
+
+# csrf_exempt в Django 3.2 оборачивает view синхронной функцией, поэтому флаг ставим напрямую, как делает DRF
+get_or_patch_courier.csrf_exempt = True
+
+
+@api_view(['PATCH'])
+def patch_courier(request, courier_id):
     try:
         courier = Courier.objects.get(courier_id=courier_id)
     except Exception:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    if request.method == 'PATCH':
-        serializer = CourierSerializer(courier, data=request.data, partial=True)
+    serializer = CourierSerializer(courier, data=request.data, partial=True)
+
+    if serializer.is_valid():
+        serializer.save()
 
-        if serializer.is_valid():
-            serializer.save()
+        if settings.REASSIGN_ASYNC:
+            ReassignmentManager.push(courier.courier_id)
+        else:
             CourierManager.reassign_orders(courier)
 
-            return Response({
-                "courier_id": courier.courier_id,
-                "courier_type": courier.courier_type,
-                "regions": courier.regions,
-                "working_hours": courier.get_working_hours()
-            }, status=status.HTTP_200_OK)
+        CourierInfoCache.invalidate(courier.courier_id)
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "courier_id": courier.courier_id,
+            "courier_type": courier.courier_type,
+            "regions": courier.regions,
+            "working_hours": courier.get_working_hours()
+        }, status=status.HTTP_200_OK)
 
-    elif request.method == 'GET':
-        return Response(CourierManager.get_info(courier), status.HTTP_200_OK)
+    return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(["POST"])
+@api_view(['GET'])
+def cache_stats(request):
+    return Response({"couriers": CourierInfoCache.get_stats()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def region_stats(request):
+    return Response({"regions": RegionBacklogManager.get_list()}, status=status.HTTP_200_OK)
+
+
+@api_view(["GET", "POST"])
 def orders(request):
-    try:
-        not_valid_orders = []
-        valid_orders = []
+    if request.method == 'GET':
+        try:
+            limit, offset = get_pagination(request)
 
-        for data in request.data['data']:
-            serializer = OrderSerializer(data=data)
+            return Response({
+                "orders": OrderManager.get_list(
+                    status=request.query_params.get('status'),
+                    limit=limit,
+                    offset=offset
+                )
+            }, status=status.HTTP_200_OK)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-            if serializer.is_valid():
-                serializer.save()
-                valid_orders.append({"id": serializer.validated_data["order_id"]})
-            else:
-                not_valid_orders.append({"id": data["order_id"]})
+    try:
+        if is_ndjson(request):
+            valid_orders, not_valid_orders = OrderImporter.run_stream(parse_ndjson(request.stream))
+        else:
+            valid_orders, not_valid_orders = OrderImporter.run(request.data['data'])
 
         if len(not_valid_orders) > 0:
             return Response({
@@ -95,20 +163,60 @@ def orders(request):
 def orders_assign(request):
     try:
         couriers_id = request.data['courier_id']
-        orders_to_assign = OrderManager.get_orders_to_assign(couriers_id)
 
-        return Response(OrderManager.assign_orders_to_courier(couriers_id, orders_to_assign), status=status.HTTP_200_OK)
+        return Response(OrderManager.assign(couriers_id), status=status.HTTP_200_OK)
     except ValueError:
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+def orders_assign_batch(request):
+    try:
+        courier_ids = request.data['courier_ids']
+
+        if not isinstance(courier_ids, list) or not all(isinstance(courier_id, int) for courier_id in courier_ids):
+            raise ValueError("Передан некорректный список курьеров")
+
+        existing_ids = CourierManager.get_existing_ids(courier_ids)
+        not_valid_couriers = [{"id": courier_id} for courier_id in courier_ids if courier_id not in existing_ids]
+
+        if len(not_valid_couriers) > 0:
+            return Response({
+                "validation_error": {
+                    "couriers": not_valid_couriers
+                }
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(OrderManager.assign_batch(courier_ids), status=status.HTTP_200_OK)
+    except (KeyError, ValueError):
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(["POST"])
 def orders_complete(request):
     try:
+        if not isinstance(request.data, dict):
+            raise DatabaseError("Передан некорректный запрос")
+
+        if 'data' in request.data:
+            if not isinstance(request.data['data'], list):
+                raise DatabaseError("Передан некорректный список заказов")
+
+            completed_orders, not_valid_orders = OrderManager.complete_batch(request.data['data'])
+
+            if len(not_valid_orders) > 0:
+                return Response({
+                    "validation_error": {
+                        "orders": not_valid_orders
+                    }
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({"orders": completed_orders}, status=status.HTTP_200_OK)
+
         courier_id = request.data['courier_id']
         order_id = request.data['order_id']
         complete_time = request.data['complete_time']
 
         return Response(OrderManager.complete(courier_id, order_id, complete_time), status=status.HTTP_200_OK)
-    except DatabaseError:
+    except (DatabaseError, KeyError):
         return Response(status=status.HTTP_400_BAD_REQUEST)
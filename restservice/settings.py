@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -72,13 +75,83 @@ WSGI_APPLICATION = 'restservice.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the backend:
+#  - sqlite      the default single-file database
+#  - sqlite-wal  SQLite tuned for a single node: WAL journal, synchronous=NORMAL and a busy timeout,
+#                so readers don't block the writer and concurrent writers wait instead of failing
+#  - postgres    PostgreSQL through psycopg2; pooling is done by pgbouncer (see docker-compose.prod.yaml)
+# CONN_MAX_AGE keeps connections open between requests. The default suits sync serving (runserver, WSGI).
+# Set it to 0 under ASGI, where every request runs in its own thread and would hold its own connection;
+# rely on pgbouncer there instead (docker-compose.prod.yaml does both).
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'restservice'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            # pgbouncer in transaction mode can't keep server-side cursors between transactions
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+elif DB_PROFILE in ('sqlite', 'sqlite-wal'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                # Seconds to wait for a locked database (sqlite3 busy timeout)
+                'timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 20 if DB_PROFILE == 'sqlite-wal' else 5)),
+            },
+        }
     }
+else:
+    raise ImproperlyConfigured("Unknown DB_PROFILE: {}".format(DB_PROFILE))
+
+# PRAGMAs applied to every new SQLite connection (see rest.apps)
+SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'} if DB_PROFILE == 'sqlite-wal' else {}
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# The "couriers" cache holds GET /couriers/{id} payloads; any Django cache backend can be plugged in
+# through the environment (e.g. django.core.cache.backends.memcached.PyMemcacheCache).
+# LocMemCache lives inside one process, so invalidation on writes would only reach the worker that handled
+# the write; with several workers (WEB_CONCURRENCY > 1) and no shared backend the cache is turned off.
+# gunicorn.conf.py exports the worker count it actually starts, so its default and --workers are covered too.
+
+COURIER_CACHE_BACKEND = os.environ.get('COURIER_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+if COURIER_CACHE_BACKEND.endswith('LocMemCache') and int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+    COURIER_CACHE_BACKEND = 'django.core.cache.backends.dummy.DummyCache'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'couriers': {
+        'BACKEND': COURIER_CACHE_BACKEND,
+        'LOCATION': os.environ.get('COURIER_CACHE_LOCATION', 'couriers'),
+        'TIMEOUT': int(os.environ.get('COURIER_CACHE_TIMEOUT', 60)),
+    },
 }
 
+if COURIER_CACHE_BACKEND.endswith('LocMemCache'):
+    # LocMemCache evicts the least recently used entries once MAX_ENTRIES is reached
+    CACHES['couriers']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('COURIER_CACHE_MAX_ENTRIES', 10000)),
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -118,3 +191,17 @@ STATIC_URL = '/static/'
 REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
+
+# When enabled, PATCH /couriers/{id} only queues the reassignment of the courier's orders;
+# the queue is processed by `manage.py reassign_worker`
+
+REASSIGN_ASYNC = os.environ.get('REASSIGN_ASYNC', '0') == '1'
+
+# Order assignment strategy per courier type: greedy, lightest_first or knapsack
+# (see rest/assignment.py and `manage.py bench_assignment`)
+
+ASSIGNMENT_STRATEGIES = {
+    'foot': 'greedy',
+    'bike': 'greedy',
+    'car': 'greedy',
+}
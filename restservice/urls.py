@@ -9,5 +9,8 @@ urlpatterns = [
     path('couriers/<int:courier_id>', views.get_or_patch_courier, name="get_or_patch_courier"),
     path('orders', views.orders, name="orders"),
     path('orders/assign', views.orders_assign, name="orders_assign"),
-    path('orders/complete', views.orders_complete, name="orders_complete")
+    path('orders/assign/batch', views.orders_assign_batch, name="orders_assign_batch"),
+    path('orders/complete', views.orders_complete, name="orders_complete"),
+    path('stats/cache', views.cache_stats, name="cache_stats"),
+    path('stats/regions', views.region_stats, name="region_stats")
 ]